@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+from .middleware import counting_queries
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+read_executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_READ_THREADS,
+    thread_name_prefix="foodgram-read",
+)
+
+
+def in_worker(func, thread_sensitive=False):
+    """Асинхронная обёртка, выполняющая ``func`` с доступом к БД.
+
+    Django 3.2 не умеет асинхронный ORM, поэтому запросы выполняются в
+    пуле ``read_executor``. Соединения закрываются так же, как в конце
+    обычного запроса, чтобы потоки пула не держали их открытыми.
+    """
+
+    def call(*args, **kwargs):
+        try:
+            with counting_queries():
+                return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    if thread_sensitive:
+        return sync_to_async(call, thread_sensitive=True)
+    return sync_to_async(
+        call, thread_sensitive=False, executor=read_executor
+    )
+
+
+def async_read(view):
+    """Асинхронная версия представления для ASGI.
+
+    Чтение выполняется параллельно в пуле потоков, а запись — как обычное
+    синхронное представление Django, в общем потоке.
+    """
+    read = in_worker(view)
+    write = in_worker(view, thread_sensitive=True)
+
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        if request.method in READ_METHODS:
+            return await read(request, *args, **kwargs)
+        return await write(request, *args, **kwargs)
+
+    return async_view
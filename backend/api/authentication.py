@@ -0,0 +1,53 @@
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+User = get_user_model()
+
+TOKEN_KEY = "foodgram:token:{}"
+
+# Пароль и счётчики, которые меняются через update(), не кэшируются:
+# они загрузятся из БД при обращении и не перезапишутся при save().
+USER_FIELDS = [
+    field.attname
+    for field in User._meta.concrete_fields
+    if field.primary_key or (field.editable and field.name != "password")
+]
+
+
+def token_cache_key(key):
+    return TOKEN_KEY.format(hashlib.sha1(key.encode()).hexdigest())
+
+
+def evict_tokens(keys):
+    """Удаляет токены из общего кэша: все процессы сразу их отвергнут."""
+    cache.delete_many([token_cache_key(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """``TokenAuthentication`` без запроса к БД для известных токенов."""
+
+    def authenticate_credentials(self, key):
+        cache_key = token_cache_key(key)
+        values = cache.get(cache_key)
+        if values is None:
+            user, token = super().authenticate_credentials(key)
+            values = tuple(getattr(user, name) for name in USER_FIELDS)
+            cache.set(cache_key, values, settings.TOKEN_CACHE_TIMEOUT)
+            return user, token
+        user = User.from_db(DEFAULT_DB_ALIAS, USER_FIELDS, values)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _("User inactive or deleted.")
+            )
+        token = self.get_model().from_db(
+            DEFAULT_DB_ALIAS, ["key", "user_id"], (key, user.pk)
+        )
+        token.user = user
+        return user, token
@@ -0,0 +1,118 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.utils.http import parse_etags, quote_etag
+from foodgram.db_router import reading_from_replica, replica_epoch
+from recipes.cache import get_version, get_versions, user_version
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def make_etag(*parts):
+    raw = "|".join(str(part) for part in parts)
+    return quote_etag(hashlib.sha1(raw.encode()).hexdigest())
+
+
+def etag_matches(request, etag):
+    header = request.META.get("HTTP_IF_NONE_MATCH")
+    if not header:
+        return False
+    etags = parse_etags(header)
+    return "*" in etags or etag in etags or f"W/{etag}" in etags
+
+
+class ConditionalGetMixin:
+    """ETag и ответ 304 для ``list`` и ``retrieve`` без сериализации.
+
+    ETag списка собирается из версий наборов данных ``list_versions``,
+    ETag объекта — из его ``updated_at`` и версий ``object_versions``.
+    Если ответ зависит от пользователя (``user_dependent``), в ETag
+    добавляется версия его избранного, корзины и подписок. Ответ,
+    прочитанный с реплики, мог отстать от версий, поэтому его ETag
+    меняется с каждым окном ``replica_epoch``.
+
+    Счётчики не меняют версий, поэтому ETag списка с сортировкой из
+    ``counter_orderings`` меняется с каждым окном ``FEED_CACHE_TIMEOUT``
+    — так же долго живёт закэшированная страница. В ответах абсолютные
+    ссылки на изображения, поэтому в ETag входит и хост.
+    """
+
+    list_versions = ()
+    object_versions = ()
+    user_dependent = False
+    counter_orderings = ()
+
+    def get_etag_parts(self, request, names):
+        parts = [
+            request.get_host(),
+            request.accepted_renderer.format,
+            *get_versions(list(names)),
+        ]
+        if self.user_dependent and request.user.is_authenticated:
+            parts += [
+                request.user.pk,
+                get_version(user_version(request.user.pk)),
+            ]
+        if reading_from_replica():
+            parts.append(replica_epoch())
+        return parts
+
+    def get_list_etag(self, request):
+        params = sorted(
+            (name, sorted(values))
+            for name, values in request.query_params.lists()
+        )
+        parts = self.get_etag_parts(request, self.list_versions)
+        if request.query_params.get("ordering") in self.counter_orderings:
+            parts.append(
+                int(time.time() // max(settings.FEED_CACHE_TIMEOUT, 1))
+            )
+        return make_etag("list", request.path, params, *parts)
+
+    def get_object_etag(self, request):
+        pk = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        try:
+            updated_at = self.queryset.model.objects.filter(
+                **{self.lookup_field: pk}
+            ).values_list("updated_at", flat=True).first()
+        except (TypeError, ValueError):
+            return None
+        if updated_at is None:
+            return None
+        return make_etag(
+            "object",
+            pk,
+            updated_at.isoformat(),
+            *self.get_etag_parts(request, self.object_versions)
+        )
+
+    def conditional(self, request, etag, build_response):
+        if etag is not None and etag_matches(request, etag):
+            return Response(
+                status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag}
+            )
+        response = build_response()
+        if etag is not None and response.status_code == status.HTTP_200_OK:
+            response["ETag"] = etag
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(
+            request,
+            self.get_list_etag(request),
+            lambda: self.build_list(request, *args, **kwargs)
+        )
+
+    def build_list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(
+            request,
+            self.get_object_etag(request),
+            lambda: self.build_object(request, *args, **kwargs)
+        )
+
+    def build_object(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
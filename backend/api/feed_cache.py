@@ -0,0 +1,74 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from foodgram.db_router import reading_from_replica
+from recipes.cache import (INGREDIENTS_VERSION, RECIPES_VERSION, TAGS_VERSION,
+                           get_version)
+from recipes.models import Favourite, ShoppingCart
+from users.models import Follow
+
+USER_FILTERS = ("is_favorited", "is_in_shopping_cart")
+
+
+def is_cacheable(request):
+    """Страница ленты не зависит от пользователя, кроме его флагов."""
+    return request.user.is_anonymous or not any(
+        request.query_params.get(name) for name in USER_FILTERS
+    )
+
+
+def feed_cache_key(request):
+    params = sorted(
+        (name, sorted(values))
+        for name, values in request.query_params.lists()
+    )
+    versions = [
+        get_version(name)
+        for name in (RECIPES_VERSION, TAGS_VERSION, INGREDIENTS_VERSION)
+    ]
+    # Страницы с реплики могут отставать от версий и не должны попадать
+    # к клиентам, закреплённым за основной БД после своих изменений.
+    source = "replica" if reading_from_replica() else "primary"
+    raw = (
+        f"{versions}|{source}|"
+        f"{request.build_absolute_uri(request.path)}|{params}"
+    )
+    return "foodgram:feed:" + hashlib.sha1(raw.encode()).hexdigest()
+
+
+def get_cached_page(request, build_page):
+    key = feed_cache_key(request)
+    data = cache.get(key)
+    if data is None:
+        data = build_page()
+        cache.set(key, data, settings.FEED_CACHE_TIMEOUT)
+    return data
+
+
+def overlay_user_flags(data, user):
+    """Проставляет в общей странице флаги конкретного пользователя."""
+    recipe_ids = [recipe["id"] for recipe in data["results"]]
+    favorited = set(Favourite.objects.filter(
+        user=user, recipe_id__in=recipe_ids
+    ).values_list("recipe_id", flat=True))
+    in_shopping_cart = set(ShoppingCart.objects.filter(
+        user=user, recipe_id__in=recipe_ids
+    ).values_list("recipe_id", flat=True))
+    subscriptions = set(Follow.objects.filter(
+        user=user,
+        author_id__in={recipe["author"]["id"] for recipe in data["results"]}
+    ).values_list("author_id", flat=True))
+    data["results"] = [
+        {
+            **recipe,
+            "author": {
+                **recipe["author"],
+                "is_subscribed": recipe["author"]["id"] in subscriptions,
+            },
+            "is_favorited": recipe["id"] in favorited,
+            "is_in_shopping_cart": recipe["id"] in in_shopping_cart,
+        }
+        for recipe in data["results"]
+    ]
+    return data
@@ -1,10 +1,52 @@
+from django import forms
 from django.contrib.auth import get_user_model
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
-from recipes.models import Ingredients, Recipe, Tags
+from recipes.indexes import author_index, tag_snapshot
+from recipes.models import Favourite, Ingredients, Recipe, ShoppingCart
+from recipes.search import search_recipes
 
 User = get_user_model()
 
 
+def tag_choices():
+    return [(slug, slug) for slug in tag_snapshot.ids_by_slug()]
+
+
+class AuthorChoiceField(forms.Field):
+    """Id автора, проверенный по ``author_index`` вместо запроса к БД.
+
+    Ошибка та же, что у ``ModelChoiceField`` по всем пользователям.
+    """
+
+    default_error_messages = {
+        "invalid_choice": forms.ModelChoiceField.default_error_messages[
+            "invalid_choice"
+        ],
+    }
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise forms.ValidationError(
+                self.error_messages["invalid_choice"], code="invalid_choice"
+            )
+
+    def validate(self, value):
+        super().validate(value)
+        if value is not None and value not in author_index:
+            raise forms.ValidationError(
+                self.error_messages["invalid_choice"], code="invalid_choice"
+            )
+
+
+class AuthorFilter(filters.Filter):
+    field_class = AuthorChoiceField
+
+
 class IngredientFilter(FilterSet):
     name = filters.CharFilter(lookup_expr="istartswith")
 
@@ -14,29 +56,54 @@ class IngredientFilter(FilterSet):
 
 
 class RecipeFilter(FilterSet):
-    tags = filters.ModelMultipleChoiceFilter(
-        field_name="tags__slug",
-        to_field_name='slug',
-        queryset=Tags.objects.all()
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices,
+        method="filter_tags"
     )
-    author = filters.ModelChoiceFilter(queryset=User.objects.all())
+    author = AuthorFilter(field_name="author_id")
     is_favorited = filters.BooleanFilter(method="filter_is_favorited")
     is_in_shopping_cart = filters.BooleanFilter(
         method="filter_is_in_shopping_cart"
     )
+    search = filters.CharFilter(method="filter_search")
+    ordering = filters.ChoiceFilter(
+        choices=(("popular", "По популярности"), ),
+        method="filter_ordering"
+    )
 
     class Meta:
         model = Recipe
         fields = ("tags", "author", )
 
+    def filter_tags(self, queryset, name, value):
+        slugs = tag_snapshot.ids_by_slug()
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe_id=OuterRef("pk"),
+                tags_id__in=[slugs[slug] for slug in value]
+            )
+        ))
+
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
         if value and not user.is_anonymous:
-            return queryset.filter(favourites__user=user)
+            return queryset.filter(Exists(Favourite.objects.filter(
+                user=user, recipe_id=OuterRef("pk")
+            )))
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         user = self.request.user
         if value and not user.is_anonymous:
-            return queryset.filter(shopping_cart_recipe__user=user)
+            return queryset.filter(Exists(ShoppingCart.objects.filter(
+                user=user, recipe_id=OuterRef("pk")
+            )))
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        if value == "popular":
+            return queryset.order_by("-favorites_count", "-pub_date")
         return queryset
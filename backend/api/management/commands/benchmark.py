@@ -0,0 +1,225 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from recipes.models import Ingredients, Recipe
+from rest_framework.authtoken.models import Token
+
+User = get_user_model()
+
+DEFAULT_BASELINE = os.path.join(
+    settings.BASE_DIR, "benchmarks", "baseline.json"
+)
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, rank):
+    values = sorted(values)
+    index = max(0, int(round(rank / 100 * len(values))) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = "benchmark the main API endpoints against stored baselines"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help="Количество запросов к каждому эндпоинту",
+        )
+        parser.add_argument("--warmup", type=int, default=10)
+        parser.add_argument("--threads", type=int, default=1)
+        parser.add_argument(
+            "--endpoint",
+            action="append",
+            dest="endpoints",
+            help="Запустить только указанные эндпоинты",
+        )
+        parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+        parser.add_argument(
+            "--save-baseline",
+            action="store_true",
+            help="Сохранить результаты как новую базовую линию",
+        )
+        parser.add_argument(
+            "--ci",
+            action="store_true",
+            default=bool(os.getenv("CI")),
+            help="Завершиться с ошибкой, если базовой линии нет "
+                 "(включено, если задана переменная окружения CI)",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.2,
+            help="Допустимое ухудшение относительно базовой линии",
+        )
+
+    def handle(self, *args, **options):
+        endpoints = self.get_endpoints()
+        if options["endpoints"]:
+            unknown = set(options["endpoints"]) - set(endpoints)
+            if unknown:
+                raise CommandError(
+                    f"Неизвестные эндпоинты: {', '.join(sorted(unknown))}"
+                )
+            endpoints = OrderedDict(
+                (name, endpoints[name]) for name in options["endpoints"]
+            )
+
+        results = OrderedDict()
+        for name, (path, headers) in endpoints.items():
+            results[name] = self.run(
+                path,
+                headers,
+                options["requests"],
+                options["warmup"],
+                options["threads"],
+            )
+            self.report(name, results[name])
+
+        if options["save_baseline"]:
+            os.makedirs(os.path.dirname(options["baseline"]), exist_ok=True)
+            with open(options["baseline"], "w", encoding="utf-8") as file:
+                json.dump(results, file, indent=2)
+            self.stdout.write(self.style.SUCCESS(
+                f"Базовая линия сохранена: {options['baseline']}"
+            ))
+            return
+        self.compare(
+            results, options["baseline"], options["tolerance"], options["ci"]
+        )
+
+    def get_endpoints(self):
+        user = User.objects.annotate(
+            follows=Count("follower", distinct=True),
+            carts=Count("shopping_cart_user", distinct=True),
+        ).order_by("-follows", "-carts").first()
+        recipe = Recipe.objects.first()
+        ingredient = Ingredients.objects.first()
+        if user is None or recipe is None or ingredient is None:
+            raise CommandError(
+                "База пуста, выполните load_ingredients и seed_fake_data"
+            )
+        token, _ = Token.objects.get_or_create(user=user)
+        auth = {"HTTP_AUTHORIZATION": f"Token {token.key}"}
+        return OrderedDict((
+            ("feed", ("/api/recipes/", {})),
+            ("feed_auth", ("/api/recipes/", auth)),
+            ("detail", (f"/api/recipes/{recipe.id}/", auth)),
+            ("subscriptions", (
+                "/api/users/subscriptions/?recipes_limit=3", auth
+            )),
+            ("download_shopping_cart", (
+                "/api/recipes/download_shopping_cart/", auth
+            )),
+            ("autocomplete", (
+                f"/api/ingredients/?name={ingredient.name[:2]}", {}
+            )),
+        ))
+
+    def run(self, path, headers, requests, warmup, threads):
+        latencies = []
+        lock = threading.Lock()
+
+        def worker(amount):
+            client = Client(**headers)
+            own = []
+            try:
+                for _ in range(amount):
+                    started = time.perf_counter()
+                    response = client.get(path)
+                    if response.streaming:
+                        b"".join(response.streaming_content)
+                    own.append(time.perf_counter() - started)
+                    if response.status_code != 200:
+                        raise CommandError(
+                            f"{path} вернул {response.status_code}"
+                        )
+            finally:
+                connection.close()
+            with lock:
+                latencies.extend(own)
+
+        client = Client(**headers)
+        for _ in range(warmup):
+            client.get(path)
+        per_thread = [requests // threads] * threads
+        per_thread[0] += requests - sum(per_thread)
+        started = time.perf_counter()
+        if threads == 1:
+            worker(requests)
+        else:
+            pool = [
+                threading.Thread(target=worker, args=(amount, ))
+                for amount in per_thread
+            ]
+            for thread in pool:
+                thread.start()
+            for thread in pool:
+                thread.join()
+        elapsed = time.perf_counter() - started
+        if len(latencies) != requests:
+            raise CommandError(f"{path}: не все запросы выполнены")
+        result = OrderedDict(
+            (f"p{rank}", percentile(latencies, rank) * 1000)
+            for rank in PERCENTILES
+        )
+        result["rps"] = requests / elapsed
+        return result
+
+    def report(self, name, result):
+        self.stdout.write(
+            f"{name:<24}"
+            + "".join(
+                f"p{rank}={result[f'p{rank}']:8.2f} мс  "
+                for rank in PERCENTILES
+            )
+            + f"{result['rps']:8.1f} зап/с"
+        )
+
+    def compare(self, results, path, tolerance, ci=False):
+        if not os.path.exists(path):
+            if ci:
+                raise CommandError(
+                    f"Базовая линия {path} не найдена, сохраните её "
+                    f"с --save-baseline"
+                )
+            self.stdout.write(
+                f"Базовая линия {path} не найдена, сравнение пропущено"
+            )
+            return
+        with open(path, encoding="utf-8") as file:
+            baseline = json.load(file)
+        regressions = []
+        for name, result in results.items():
+            expected = baseline.get(name)
+            if expected is None:
+                continue
+            for rank in PERCENTILES[1:]:
+                key = f"p{rank}"
+                if result[key] > expected[key] * (1 + tolerance):
+                    regressions.append(
+                        f"{name} {key}: {result[key]:.2f} мс "
+                        f"(было {expected[key]:.2f} мс)"
+                    )
+            if result["rps"] < expected["rps"] * (1 - tolerance):
+                regressions.append(
+                    f"{name} rps: {result['rps']:.1f} "
+                    f"(было {expected['rps']:.1f})"
+                )
+        if regressions:
+            raise CommandError(
+                "Обнаружена деградация:\n" + "\n".join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS("Деградаций не обнаружено"))
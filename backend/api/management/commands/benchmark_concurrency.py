@@ -0,0 +1,207 @@
+import asyncio
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+from django.core.management import BaseCommand, CommandError
+
+from .benchmark import PERCENTILES, percentile
+
+SLOW_READ_SIZE = 512
+
+
+class HTTPClient:
+    """Минимальный HTTP/1.1 клиент с keep-alive поверх asyncio.
+
+    С ``read_delay`` тело ответа читается по ``SLOW_READ_SIZE`` байт с
+    паузой после каждой части, как у клиента на медленном канале.
+    """
+
+    def __init__(self, host, port, headers, read_delay=0):
+        self.host = host
+        self.port = port
+        self.headers = headers
+        self.read_delay = read_delay
+        self.reader = self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(
+            self.host, self.port
+        )
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+    async def read_body(self, size=None):
+        """Читает ``size`` байт тела или, без ``size``, до конца потока."""
+        if not self.read_delay:
+            if size is None:
+                await self.reader.read()
+            else:
+                await self.reader.readexactly(size)
+            return
+        while size is None or size > 0:
+            chunk = await self.reader.read(
+                SLOW_READ_SIZE if size is None else min(size, SLOW_READ_SIZE)
+            )
+            if not chunk:
+                if size is None:
+                    return
+                raise asyncio.IncompleteReadError(b"", size)
+            if size is not None:
+                size -= len(chunk)
+            await asyncio.sleep(self.read_delay)
+
+    async def get(self, path):
+        if self.writer is None:
+            await self.connect()
+        lines = [f"GET {path} HTTP/1.1", f"Host: {self.host}"]
+        lines += [f"{name}: {value}" for name, value in self.headers]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+        await self.writer.drain()
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Соединение закрыто сервером")
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                await self.read_body(size + 2)
+                if size == 0:
+                    break
+        elif "content-length" in headers:
+            await self.read_body(int(headers["content-length"]))
+        else:
+            await self.read_body()
+            self.close()
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return int(status_line.split()[1])
+
+
+class Command(BaseCommand):
+    help = (
+        "compare throughput of running WSGI and ASGI deployments "
+        "under many concurrent and slow connections"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target",
+            action="append",
+            dest="targets",
+            required=True,
+            help="Сервер в виде имя=http://host:port, можно несколько",
+        )
+        parser.add_argument("--path", default="/api/recipes/")
+        parser.add_argument(
+            "--connections",
+            type=int,
+            default=50,
+            help="Количество одновременно работающих клиентов",
+        )
+        parser.add_argument(
+            "--slow-clients",
+            type=int,
+            default=0,
+            help="Количество медленных клиентов: запрос они отправляют "
+                 "сразу, а ответ читают по 512 байт в секунду",
+        )
+        parser.add_argument("--duration", type=float, default=10)
+        parser.add_argument(
+            "--token",
+            help="Токен для заголовка Authorization",
+        )
+
+    def handle(self, *args, **options):
+        targets = OrderedDict()
+        for target in options["targets"]:
+            name, _, url = target.partition("=")
+            parts = urlsplit(url)
+            if not name or parts.scheme != "http" or not parts.hostname:
+                raise CommandError(f"Неверная цель: {target}")
+            targets[name] = (parts.hostname, parts.port or 80)
+        headers = [("Accept", "application/json")]
+        if options["token"]:
+            headers.append(("Authorization", f"Token {options['token']}"))
+
+        for name, (host, port) in targets.items():
+            result = asyncio.run(self.run(
+                host,
+                port,
+                headers,
+                options["path"],
+                options["connections"],
+                options["slow_clients"],
+                options["duration"],
+            ))
+            self.report(name, result)
+
+    async def run(self, host, port, headers, path, connections,
+                  slow_clients, duration):
+        deadline = time.monotonic() + duration
+        latencies = []
+        errors = [0]
+
+        async def client(read_delay=0):
+            # Медленные клиенты только держат соединения, их задержки
+            # не учитываются.
+            record = not read_delay
+            http = HTTPClient(host, port, headers, read_delay)
+            try:
+                while time.monotonic() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        status = await http.get(path)
+                    except (OSError, ValueError, IndexError,
+                            asyncio.IncompleteReadError):
+                        http.close()
+                        errors[0] += record
+                        await asyncio.sleep(0.01)
+                        continue
+                    if status != 200:
+                        errors[0] += record
+                        continue
+                    if record:
+                        latencies.append(time.perf_counter() - started)
+            finally:
+                http.close()
+
+        slow = [
+            asyncio.ensure_future(client(read_delay=1))
+            for _ in range(slow_clients)
+        ]
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(connections)))
+        elapsed = time.perf_counter() - started
+        for task in slow:
+            task.cancel()
+        await asyncio.gather(*slow, return_exceptions=True)
+        result = OrderedDict(
+            (
+                f"p{rank}",
+                percentile(latencies, rank) * 1000 if latencies else 0,
+            )
+            for rank in PERCENTILES
+        )
+        result["rps"] = len(latencies) / elapsed
+        result["errors"] = errors[0]
+        return result
+
+    def report(self, name, result):
+        self.stdout.write(
+            f"{name:<12}"
+            + "".join(
+                f"p{rank}={result[f'p{rank}']:8.2f} мс  "
+                for rank in PERCENTILES
+            )
+            + f"{result['rps']:8.1f} зап/с  ошибок: {result['errors']}"
+        )
@@ -0,0 +1,90 @@
+import threading
+from collections import OrderedDict
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+METRICS = (
+    (
+        "foodgram_request_duration_seconds",
+        "Время обработки запроса",
+        DURATION_BUCKETS,
+    ),
+    (
+        "foodgram_request_queries",
+        "Количество SQL-запросов на запрос",
+        QUERY_BUCKETS,
+    ),
+    (
+        "foodgram_request_sql_duration_seconds",
+        "Суммарное время SQL-запросов на запрос",
+        DURATION_BUCKETS,
+    ),
+)
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+
+
+class MetricsRegistry:
+    """Гистограммы запросов по представлениям в памяти процесса."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = OrderedDict()
+
+    def observe(self, labels, duration, queries, sql_duration):
+        values = (duration, queries, sql_duration)
+        with self._lock:
+            if labels not in self._histograms:
+                self._histograms[labels] = [
+                    Histogram(buckets) for _, _, buckets in METRICS
+                ]
+            for histogram, value in zip(self._histograms[labels], values):
+                histogram.observe(value)
+
+    def render(self):
+        """Возвращает метрики в текстовом формате Prometheus."""
+        lines = []
+        with self._lock:
+            for position, (name, description, _) in enumerate(METRICS):
+                lines.append(f"# HELP {name} {description}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histograms in self._histograms.items():
+                    histogram = histograms[position]
+                    label = ",".join(
+                        f'{key}="{value}"' for key, value in labels
+                    )
+                    for bound, count in zip(
+                        histogram.buckets, histogram.counts
+                    ):
+                        lines.append(
+                            f'{name}_bucket{{{label},le="{bound}"}} {count}'
+                        )
+                    lines.append(
+                        f'{name}_bucket{{{label},le="+Inf"}} '
+                        f'{histogram.count}'
+                    )
+                    lines.append(f"{name}_sum{{{label}}} {histogram.sum}")
+                    lines.append(
+                        f"{name}_count{{{label}}} {histogram.count}"
+                    )
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from foodgram.db_router import choose_replica, read_alias
+from rest_framework.permissions import SAFE_METHODS
+
+from .metrics import registry
+
+current_counter = ContextVar("query_counter", default=None)
+
+
+class QueryCounter:
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+@contextmanager
+def counting_queries():
+    """Подключает счётчик текущего запроса к соединениям этого потока.
+
+    Соединения с БД у каждого потока свои, поэтому код, выполняющий
+    запросы в другом потоке, должен войти в этот контекст сам.
+    """
+    counter = current_counter.get()
+    with ExitStack() as stack:
+        if counter is not None:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(counter))
+        yield
+
+
+class QueryMetricsMiddleware:
+    """Собирает время ответа и SQL-запросы по представлению и действию."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        counter = QueryCounter()
+        token = current_counter.set(counter)
+        started = time.perf_counter()
+        try:
+            with counting_queries():
+                response = self.get_response(request)
+        finally:
+            current_counter.reset(token)
+        self.observe(request, time.perf_counter() - started, counter)
+        return response
+
+    async def __acall__(self, request):
+        counter = QueryCounter()
+        token = current_counter.set(counter)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_counter.reset(token)
+        self.observe(request, time.perf_counter() - started, counter)
+        return response
+
+    def observe(self, request, duration, counter):
+        view = getattr(request, "metrics_view", None)
+        if view is not None:
+            registry.observe(
+                (
+                    ("view", view[0]),
+                    ("action", view[1]),
+                    ("method", request.method),
+                ),
+                duration,
+                counter.count,
+                counter.duration,
+            )
+
+    async def aprocess_view(self, request, *args):
+        # Без переключения в синхронный поток, как для обычного process_view.
+        self.process_view_sync(request, *args)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self.process_view_sync(request, view_func, view_args, view_kwargs)
+
+    def process_view_sync(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, "cls", None)
+        if view_class is None:
+            name = f"{view_func.__module__}.{view_func.__name__}"
+        else:
+            name = view_class.__name__
+        actions = getattr(view_func, "actions", None) or {}
+        request.metrics_view = (name, actions.get(request.method.lower(), ""))
+
+
+class ReplicaMiddleware:
+    """Отправляет чтение представлений с ``replica_reads`` на реплики.
+
+    После успешного изменяющего запроса клиент на
+    ``DB_REPLICA_STICKY_SECONDS`` закрепляется за основной БД, чтобы сразу
+    видеть свои изменения. Клиент определяется по заголовку
+    Authorization: пользователь DRF ещё не известен, когда выбирается БД.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = read_alias.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            read_alias.reset(token)
+        self.remember_write(request, response)
+        return response
+
+    async def __acall__(self, request):
+        token = read_alias.set(None)
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_alias.reset(token)
+        self.remember_write(request, response)
+        return response
+
+    def sticky_key(self, request):
+        header = request.META.get("HTTP_AUTHORIZATION")
+        if not header:
+            return None
+        return (
+            "foodgram:primary:" + hashlib.sha1(header.encode()).hexdigest()
+        )
+
+    def remember_write(self, request, response):
+        if (
+            request.method in SAFE_METHODS
+            or response.status_code >= 400
+            or not settings.DATABASE_REPLICAS
+        ):
+            return
+        key = self.sticky_key(request)
+        if key is not None:
+            cache.set(key, True, settings.DB_REPLICA_STICKY_SECONDS)
+
+    async def aprocess_view(self, request, *args):
+        self.select_database(request, *args)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        self.select_database(request, view_func, view_args, view_kwargs)
+
+    def select_database(self, request, view_func, view_args, view_kwargs):
+        if request.method not in SAFE_METHODS or not getattr(
+            getattr(view_func, "cls", None), "replica_reads", False
+        ):
+            return
+        alias = choose_replica()
+        if alias is None:
+            return
+        key = self.sticky_key(request)
+        if key is None or not cache.get(key):
+            read_alias.set(alias)
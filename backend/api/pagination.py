@@ -1,5 +1,118 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class CustomPagination(PageNumberPagination):
     page_size_query_param = "limit"
+
+
+class RecipePagination(PageNumberPagination):
+    """Страницы ленты рецептов с опциональным режимом курсора.
+
+    Если в запросе передан параметр ``cursor`` (для первой страницы —
+    пустой), страница выбирается по ключу ``(pub_date, id)``, как в
+    ``Recipe.Meta.ordering``, без COUNT(*) и OFFSET. Параметры, задающие
+    другой порядок, с курсором не сочетаются.
+    """
+
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Неверный курсор."
+    ordering_query_params = ("ordering", "search")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.use_cursor = self.cursor_query_param in request.query_params
+        if not self.use_cursor:
+            return super().paginate_queryset(queryset, request, view)
+        for param in self.ordering_query_params:
+            if request.query_params.get(param):
+                raise ValidationError({
+                    "cursor": f"Курсор нельзя сочетать с параметром {param}."
+                })
+        self.request = request
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(
+            request.query_params[self.cursor_query_param]
+        )
+        queryset = queryset.order_by("-pub_date", "-id")
+        if position is not None:
+            pub_date, pk = position
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lt=pk)
+            )
+        results = list(queryset[:page_size + 1])
+        self.has_next = len(results) > page_size
+        self.page_results = results[:page_size]
+        if self.page_results:
+            self.last_position = self.get_position(self.page_results[-1])
+        return self.page_results
+
+    def paginate_keys(self, request, fetch_keys, fetch_objects):
+        """Курсорная страница по внешнему источнику ключей.
+
+        ``fetch_keys(position, limit)`` возвращает упорядоченные ключи
+        ``(pub_date, id)``, ``fetch_objects(ids)`` — объекты или строки
+        ``values()`` страницы.
+        """
+        self.use_cursor = True
+        self.request = request
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(
+            request.query_params.get(self.cursor_query_param, "")
+        )
+        keys = fetch_keys(position, page_size + 1)
+        self.has_next = len(keys) > page_size
+        if keys:
+            # Курсор строится по ключу, а не по объекту: рецепт могли
+            # удалить между двумя запросами.
+            self.last_position = keys[:page_size][-1]
+        ids = [pk for _, pk in keys[:page_size]]
+        objects = {
+            self.get_position(obj)[1]: obj for obj in fetch_objects(ids)
+        }
+        self.page_results = [objects[pk] for pk in ids if pk in objects]
+        return self.page_results
+
+    def get_paginated_response(self, data):
+        if not self.use_cursor:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ("next", self.get_next_link()),
+            ("results", data),
+        ]))
+
+    def get_next_link(self):
+        if not self.use_cursor:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(*self.last_position)
+        )
+
+    def get_position(self, obj):
+        if isinstance(obj, dict):
+            return obj["pub_date"], obj["id"]
+        return obj.pub_date, obj.id
+
+    def encode_cursor(self, pub_date, pk):
+        raw = f"{pub_date.isoformat()}|{pk}"
+        return urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            raw = urlsafe_b64decode(cursor.encode()).decode()
+            pub_date, pk = raw.split("|")
+            return datetime.fromisoformat(pub_date), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
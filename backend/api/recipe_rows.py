@@ -0,0 +1,219 @@
+import json
+from collections import defaultdict
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from recipes.cache import (INGREDIENTS_VERSION, TAGS_VERSION, USERS_VERSION,
+                           get_versions)
+from recipes.indexes import tag_snapshot
+from recipes.models import IngredientInRecipe, Recipe, RecipeDocument, Tags
+from rest_framework import serializers
+from users.models import Follow
+
+from .serializers import image_variants_data
+
+RECIPE_FIELDS = (
+    "id",
+    "image",
+    "image_variants",
+    "name",
+    "text",
+    "cooking_time",
+    "pub_date",
+    "author_id",
+    "author__email",
+    "author__username",
+    "author__first_name",
+    "author__last_name",
+)
+USER_FLAGS = ("is_favorited", "is_in_shopping_cart")
+# Данные других таблиц в документе: авторы, тэги и ингредиенты.
+DOCUMENT_VERSIONS = (USERS_VERSION, TAGS_VERSION, INGREDIENTS_VERSION)
+
+pub_date_field = serializers.DateTimeField()
+image_storage = Recipe._meta.get_field("image").storage
+
+
+def recipe_rows(queryset):
+    """Строки рецептов для ``serialize_recipe_rows`` вместо объектов.
+
+    Флаги пользователя попадают в строки, только если ``queryset`` их
+    аннотирует, — как и в ``RecipeListSerializer``.
+    """
+    flags = [name for name in USER_FLAGS if name in queryset.query.annotations]
+    return queryset.values(*RECIPE_FIELDS, *flags)
+
+
+def user_subscriptions(user):
+    if user.is_anonymous:
+        return set()
+    return set(
+        Follow.objects.filter(user=user).values_list("author_id", flat=True)
+    )
+
+
+def recipe_tags(tag_ids, using):
+    """Тэги рецептов ``{id рецепта: [тэг, ...]}`` по их id.
+
+    Без ``using`` тэги берутся из ``tag_snapshot``. Сохраняемые документы
+    строятся по БД ``using``: снимок этого процесса может ещё не знать о
+    последнем изменении тэга, а документ переживёт его обновление.
+    """
+    if using is None:
+        return {
+            recipe_id: tag_snapshot.rows_for(ids)
+            for recipe_id, ids in tag_ids.items()
+        }
+    tags = list(
+        Tags.objects.using(using).filter(
+            pk__in={pk for ids in tag_ids.values() for pk in ids}
+        ).values(*tag_snapshot.fields)
+    )
+    return {
+        recipe_id: [tag for tag in tags if tag["id"] in set(ids)]
+        for recipe_id, ids in tag_ids.items()
+    }
+
+
+def build_documents(rows, using=None):
+    """Документы рецептов по строкам ``recipe_rows``.
+
+    Документ повторяет вывод ``RecipeListSerializer`` без флагов
+    пользователя; вместо ссылок на изображения в нём хранятся имена
+    файлов, ссылки строит ``render_document``. Тэги выбирает
+    ``recipe_tags``, ингредиенты всех рецептов — одним запросом.
+    """
+    ids = [row["id"] for row in rows]
+    tag_ids = defaultdict(list)
+    for recipe_id, tag_id in Recipe.tags.through.objects.using(
+        using
+    ).filter(recipe_id__in=ids).values_list("recipe_id", "tags_id"):
+        tag_ids[recipe_id].append(tag_id)
+    tags = recipe_tags(tag_ids, using)
+    ingredients = defaultdict(list)
+    for recipe_id, name, amount, measurement_unit in (
+        IngredientInRecipe.objects.using(using).filter(
+            recipe_id__in=ids
+        ).order_by("id").values_list(
+            "recipe_id",
+            "ingredient__name",
+            "amount",
+            "ingredient__measurement_unit",
+        )
+    ):
+        ingredients[recipe_id].append({
+            "name": name,
+            "amount": amount,
+            "measurement_unit": measurement_unit,
+        })
+    return [
+        {
+            "id": row["id"],
+            "ingredients": ingredients[row["id"]],
+            "tags": tags.get(row["id"], []),
+            "image": row["image"] or None,
+            "images": row["image_variants"],
+            "name": row["name"],
+            "text": row["text"],
+            "cooking_time": row["cooking_time"],
+            "author": {
+                "email": row["author__email"],
+                "id": row["author_id"],
+                "username": row["author__username"],
+                "first_name": row["author__first_name"],
+                "last_name": row["author__last_name"],
+            },
+            "pub_date": pub_date_field.to_representation(row["pub_date"]),
+        }
+        for row in rows
+    ]
+
+
+def render_document(document, request, subscriptions, flags=()):
+    """Ответ по документу: ссылки на изображения и флаги пользователя."""
+    data = dict(document)
+    if data["image"]:
+        data["image"] = request.build_absolute_uri(
+            image_storage.url(data["image"])
+        )
+    data["images"] = image_variants_data(data["images"], request)
+    data["author"] = {
+        **data["author"],
+        "is_subscribed": data["author"]["id"] in subscriptions,
+    }
+    for name, value in flags:
+        data[name] = bool(value)
+    return data
+
+
+def serialize_recipe_rows(rows, request, subscriptions):
+    """Повторяет вывод ``RecipeListSerializer(many=True)`` по строкам."""
+    return [
+        render_document(
+            document,
+            request,
+            subscriptions,
+            [(name, row[name]) for name in USER_FLAGS if name in row]
+        )
+        for row, document in zip(rows, build_documents(rows))
+    ]
+
+
+def document_stamp(updated_at, versions):
+    """Метка данных, по которым собран документ, как у ETag объекта."""
+    return f"{updated_at.isoformat()}|{'.'.join(map(str, versions))}"
+
+
+def store_documents(recipe_ids, replace=False):
+    """Собирает документы по основной БД и сохраняет их.
+
+    Без ``replace`` уже сохранённые документы не перезаписываются: их мог
+    обновить более поздний ``rebuild_documents``. Версии читаются до
+    запросов к БД, поэтому документ, собранный по данным до изменения,
+    получит устаревшую метку и будет пересобран при чтении.
+    """
+    versions = get_versions(DOCUMENT_VERSIONS)
+    rows = list(
+        Recipe.objects.using(DEFAULT_DB_ALIAS).filter(
+            pk__in=recipe_ids
+        ).values(*RECIPE_FIELDS, "updated_at")
+    )
+    documents = build_documents(rows, DEFAULT_DB_ALIAS)
+    if not documents and not replace:
+        return documents
+    with transaction.atomic():
+        if replace:
+            RecipeDocument.objects.filter(recipe_id__in=recipe_ids).delete()
+        RecipeDocument.objects.bulk_create(
+            [
+                RecipeDocument(
+                    recipe_id=document["id"],
+                    data=json.dumps(document, ensure_ascii=False),
+                    stamp=document_stamp(row["updated_at"], versions)
+                )
+                for row, document in zip(rows, documents)
+            ],
+            ignore_conflicts=True,
+        )
+    return documents
+
+
+def rebuild_documents(recipe_ids):
+    store_documents(recipe_ids, replace=True)
+
+
+def get_document(recipe_id):
+    """Документ рецепта; отсутствующий или устаревший собирается заново.
+
+    Документ устарел, если его метка не совпадает с ``updated_at``
+    рецепта и версиями ``DOCUMENT_VERSIONS``.
+    """
+    versions = get_versions(DOCUMENT_VERSIONS)
+    stored = RecipeDocument.objects.filter(recipe_id=recipe_id).values_list(
+        "data", "stamp", "recipe__updated_at"
+    ).first()
+    if stored is not None:
+        data, stamp, updated_at = stored
+        if stamp == document_stamp(updated_at, versions):
+            return json.loads(data)
+    documents = store_documents([recipe_id], replace=stored is not None)
+    return documents[0] if documents else None
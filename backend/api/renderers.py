@@ -0,0 +1,129 @@
+import csv
+from datetime import datetime
+from io import BytesIO
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.canvas import Canvas
+from rest_framework import exceptions, renderers
+from rest_framework.negotiation import DefaultContentNegotiation
+
+
+class PlainTextRenderer(renderers.BaseRenderer):
+    media_type = "text/plain"
+    format = "txt"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = "\n".join(f"{key}: {value}" for key, value in data.items())
+        return str(data).encode(self.charset)
+
+
+class ShoppingListTextRenderer(PlainTextRenderer):
+    """Список покупок текстом; файл отдаётся по частям через ``stream``."""
+
+    def stream(self, user, ingredients):
+        yield (
+            f"Список покупок для: {user.get_username()}\n\n"
+            f"Дата: {datetime.today():%Y-%m-%d}\n\n"
+        )
+        for ingredient in ingredients:
+            yield (
+                f"- {ingredient['ingredient__name']}"
+                f"({ingredient['ingredient__measurement_unit']})"
+                f" - {ingredient['amount']}\n"
+            )
+
+
+class Echo:
+    """Файл для ``csv.writer``, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingListCSVRenderer(ShoppingListTextRenderer):
+    media_type = "text/csv"
+    format = "csv"
+
+    def stream(self, user, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(
+            ("Ингредиент", "Единица измерения", "Количество")
+        )
+        for ingredient in ingredients:
+            yield writer.writerow((
+                ingredient["ingredient__name"],
+                ingredient["ingredient__measurement_unit"],
+                ingredient["amount"],
+            ))
+
+
+class ShoppingListPDFRenderer(ShoppingListTextRenderer):
+    """Список покупок в PDF со шрифтом из ``SHOPPING_LIST_FONT``.
+
+    Строки читаются из курсора по мере вёрстки, но файл PDF готов
+    только после последней страницы и отдаётся одним куском.
+    """
+
+    media_type = "application/pdf"
+    format = "pdf"
+    charset = None
+    font_name = "ShoppingListFont"
+    font_size = 12
+    margin = 20 * mm
+
+    def get_font(self):
+        if self.font_name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(
+                TTFont(self.font_name, settings.SHOPPING_LIST_FONT)
+            )
+        return self.font_name
+
+    def stream(self, user, ingredients):
+        buffer = BytesIO()
+        canvas = Canvas(buffer, pagesize=A4)
+        font = self.get_font()
+        width, height = A4
+        line_height = self.font_size * 1.5
+        top = height - self.margin
+        y = top
+        canvas.setFont(font, self.font_size)
+        for text in super().stream(user, ingredients):
+            for line in text.rstrip("\n").split("\n"):
+                for part in simpleSplit(
+                    line, font, self.font_size, width - 2 * self.margin
+                ) or [""]:
+                    if y < self.margin:
+                        canvas.showPage()
+                        canvas.setFont(font, self.font_size)
+                        y = top
+                    canvas.drawString(self.margin, y, part)
+                    y -= line_height
+        canvas.save()
+        yield buffer.getvalue()
+
+
+SHOPPING_LIST_RENDERERS = (
+    ShoppingListTextRenderer,
+    ShoppingListCSVRenderer,
+    ShoppingListPDFRenderer,
+)
+
+
+class ShoppingListNegotiation(DefaultContentNegotiation):
+    """Без подходящего Accept список покупок отдаётся текстом, как раньше.
+
+    Явно запрошенный неизвестный ``?format=`` по-прежнему даёт 404.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        try:
+            return super().select_renderer(request, renderers, format_suffix)
+        except exceptions.NotAcceptable:
+            return renderers[0], renderers[0].media_type
@@ -1,11 +1,15 @@
 import webcolors
 from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
 from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import Base64ImageField
 
+from recipes.images import IMAGE_FORMATS, IMAGE_VARIANTS
+from recipes.indexes import tag_snapshot
 from recipes.models import (Favourite, IngredientInRecipe, Ingredients, Recipe,
-                            ShoppingCart, Tags)
+                            ShoppingCart, ShoppingCartTotal, Tags)
+from recipes.shopping import recipe_ingredients_changed
 from rest_framework import serializers
 from users.models import Follow
 
@@ -30,7 +34,13 @@ class CustomUserSerializer(UserSerializer):
         user = self.context.get("request").user
         if user.is_anonymous:
             return False
-        return Follow.objects.filter(user=user, author=obj).exists()
+        if "subscriptions" not in self.context:
+            self.context["subscriptions"] = set(
+                Follow.objects.filter(user=user).values_list(
+                    "author_id", flat=True
+                )
+            )
+        return obj.id in self.context["subscriptions"]
 
 
 class POSTUserSerializer(UserCreateSerializer):
@@ -70,6 +80,45 @@ class Hex2NameColor(serializers.Field):
         return data
 
 
+def image_variants_data(variants, request):
+    """Ссылки на уменьшенные копии изображения и атрибуты srcset."""
+    if not variants:
+        return None
+
+    def build_url(path):
+        url = default_storage.url(path)
+        return request.build_absolute_uri(url) if request else url
+
+    data = {}
+    srcset = {extension: {} for extension, _, _ in IMAGE_FORMATS}
+    for name, _ in IMAGE_VARIANTS:
+        variant = variants.get(name)
+        if not variant:
+            continue
+        data[name] = {"width": variant["width"]}
+        for extension in srcset:
+            url = build_url(variant[extension])
+            data[name][extension] = url
+            srcset[extension].setdefault(variant["width"], url)
+    data["srcset"] = {
+        extension: ", ".join(
+            f"{url} {width}w" for width, url in urls.items()
+        )
+        for extension, urls in srcset.items()
+    }
+    return data
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+
+    def __init__(self, **kwargs):
+        kwargs["source"] = "image_variants"
+        super().__init__(**kwargs)
+
+    def to_representation(self, variants):
+        return image_variants_data(variants, self.context.get("request"))
+
+
 class TagsSerializer(serializers.ModelSerializer):
     color = Hex2NameColor
 
@@ -104,8 +153,52 @@ class IngredientsInRecipeSerializers(serializers.ModelSerializer):
         )
 
 
+class ShoppingCartTotalSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source="ingredient_id")
+    name = serializers.ReadOnlyField(source="ingredient.name")
+    measurement_unit = serializers.ReadOnlyField(
+        source="ingredient.measurement_unit"
+    )
+
+    class Meta:
+        model = ShoppingCartTotal
+        fields = (
+            "id",
+            "name",
+            "amount",
+            "measurement_unit",
+        )
+
+
+class PrimaryKeyListField(serializers.ListField):
+    child = serializers.IntegerField()
+
+    def __init__(self, queryset, **kwargs):
+        self.queryset = queryset
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        ids = super().to_internal_value(data)
+        source = self.queryset
+        if hasattr(source, "all"):
+            source = source.all()
+        found = source.in_bulk(set(ids))
+        unknown = sorted(set(ids) - set(found))
+        if unknown:
+            raise serializers.ValidationError(
+                "Объекты не найдены: "
+                + ", ".join(str(pk) for pk in unknown)
+            )
+        return [found[pk] for pk in dict.fromkeys(ids)]
+
+    def to_representation(self, value):
+        if hasattr(value, "all"):
+            value = value.all()
+        return [item.pk for item in value]
+
+
 class AmountRecipeSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredients.objects.all())
+    id = serializers.IntegerField()
 
     class Meta:
         model = IngredientInRecipe
@@ -117,6 +210,7 @@ class RecipeListSerializer(serializers.ModelSerializer):
     is_favorited = serializers.BooleanField(read_only=True)
     is_in_shopping_cart = serializers.BooleanField(read_only=True)
     image = Base64ImageField()
+    images = ImageVariantsField()
     ingredients = IngredientsInRecipeSerializers(
         source="recipe",
         many=True)
@@ -129,6 +223,7 @@ class RecipeListSerializer(serializers.ModelSerializer):
             "ingredients",
             "tags",
             "image",
+            "images",
             "name",
             "text",
             "cooking_time",
@@ -142,10 +237,7 @@ class RecipeListSerializer(serializers.ModelSerializer):
 class RecipePOSTUPDELSerializer(serializers.ModelSerializer):
     author = CustomUserSerializer(read_only=True)
     tags = TagsSerializer(many=True, read_only=True)
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tags.objects.all(),
-        many=True,
-    )
+    tags = PrimaryKeyListField(queryset=tag_snapshot)
     ingredients = AmountRecipeSerializer(many=True)
     image = Base64ImageField()
 
@@ -163,6 +255,28 @@ class RecipePOSTUPDELSerializer(serializers.ModelSerializer):
             "pub_date"
         )
 
+    def validate_ingredients(self, ingredients):
+        ids = [ingredient["id"] for ingredient in ingredients]
+        found = Ingredients.objects.in_bulk(set(ids))
+        errors = []
+        unknown = sorted(set(ids) - set(found))
+        if unknown:
+            errors.append(
+                "Ингредиенты не найдены: "
+                + ", ".join(str(pk) for pk in unknown)
+            )
+        duplicates = sorted(pk for pk in set(ids) if ids.count(pk) > 1)
+        if duplicates:
+            errors.append(
+                "Ингредиенты указаны несколько раз: "
+                + ", ".join(str(pk) for pk in duplicates)
+            )
+        if errors:
+            raise serializers.ValidationError(errors)
+        for ingredient in ingredients:
+            ingredient["id"] = found[ingredient["id"]]
+        return ingredients
+
     def create_ingredients(self, ingredients, recipe):
         new_ingredient = [
             IngredientInRecipe(
@@ -183,22 +297,85 @@ class RecipePOSTUPDELSerializer(serializers.ModelSerializer):
         self.create_ingredients(ingredients, recipe)
         return recipe
 
+    def update_ingredients(self, ingredients, recipe):
+        current = {
+            row.ingredient_id: row
+            for row in IngredientInRecipe.objects.filter(recipe=recipe)
+        }
+        amounts = {
+            ingredient.get("id").id: ingredient.get("amount")
+            for ingredient in ingredients
+        }
+        removed = set(current) - set(amounts)
+        if removed:
+            IngredientInRecipe.objects.filter(
+                recipe=recipe,
+                ingredient_id__in=removed
+            ).delete()
+        changed = []
+        deltas = {}
+        for ingredient_id, amount in amounts.items():
+            row = current.get(ingredient_id)
+            if row is None:
+                deltas[ingredient_id] = amount
+            elif row.amount != amount:
+                deltas[ingredient_id] = amount - row.amount
+                row.amount = amount
+                changed.append(row)
+        added = [
+            IngredientInRecipe(
+                recipe=recipe,
+                ingredient_id=ingredient_id,
+                amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        ]
+        IngredientInRecipe.objects.bulk_update(changed, ["amount"])
+        IngredientInRecipe.objects.bulk_create(added)
+        recipe_ingredients_changed(recipe.pk, deltas)
+        return bool(removed or changed or added)
+
+    def is_same_image(self, current, uploaded):
+        if not current:
+            return False
+        try:
+            if current.size != uploaded.size:
+                return False
+            with current.open("rb"):
+                same = current.read() == uploaded.read()
+        except OSError:
+            return False
+        finally:
+            uploaded.seek(0)
+        return same
+
     @transaction.atomic
     def update(self, instance, validated_data):
-        instance.name = validated_data.get("name", instance.name)
-        instance.image = validated_data.get("image", instance.image)
-        instance.text = validated_data.get("text", instance.text)
-        instance.cooking_time = validated_data.get(
-            "cooking_time",
-            instance.cooking_time
-        )
-        instance.tags.clear()
-        instance.ingredients.clear()
-        tags = self.validated_data.get("tags")
-        instance.tags.set(tags)
-        IngredientInRecipe.objects.filter(recipe=instance).all().delete()
-        self.create_ingredients(validated_data.get("ingredients"), instance)
-        instance.save()
+        ingredients = validated_data.pop("ingredients", None)
+        tags = validated_data.pop("tags", None)
+        image = validated_data.pop("image", None)
+        changed = [
+            field for field, value in validated_data.items()
+            if getattr(instance, field) != value
+        ]
+        for field in changed:
+            setattr(instance, field, validated_data[field])
+        if image is not None and not self.is_same_image(
+            instance.image, image
+        ):
+            instance.image = image
+            changed.append("image")
+        related_changed = False
+        if tags is not None and {tag.pk for tag in tags} != set(
+            instance.tags.values_list("pk", flat=True)
+        ):
+            instance.tags.set(tags)
+            related_changed = True
+        if ingredients is not None:
+            related_changed |= self.update_ingredients(ingredients, instance)
+        if changed or related_changed:
+            instance.save(update_fields=changed + ["updated_at"])
         return instance
 
     def to_representation(self, obj):
@@ -206,7 +383,10 @@ class RecipePOSTUPDELSerializer(serializers.ModelSerializer):
 
 
 class FollowSerializer(CustomUserSerializer):
-    count_recipes = serializers.SerializerMethodField()
+    count_recipes = serializers.IntegerField(
+        source="recipes_count",
+        read_only=True
+    )
     recipes = serializers.SerializerMethodField()
 
     class Meta:
@@ -223,22 +403,11 @@ class FollowSerializer(CustomUserSerializer):
             "email"
         )
 
-    def get_count_recipes(self, obj):
-        return obj.recipes.count()
-
     def get_recipes(self, obj):
-        request = self.context.get("request")
-        limit = request.query_params.get("recipes_limit")
-        if limit:
-            return RecipeInfoSerializer(
-                Recipe.objects.filter(author=obj)[:int(limit)],
-                many=True,
-                context={"request": request}
-            ).data
         return RecipeInfoSerializer(
-            Recipe.objects.filter(author=obj),
+            obj.recipes.all(),
             many=True,
-            context={"request": request}
+            context=self.context
         ).data
 
 
@@ -251,10 +420,11 @@ class FollowListSerializer(serializers.ModelSerializer):
 
 class RecipeInfoSerializer(serializers.ModelSerializer):
     image = Base64ImageField()
+    images = ImageVariantsField()
 
     class Meta:
         model = Recipe
-        fields = ("id", "name", "image", "cooking_time")
+        fields = ("id", "name", "image", "images", "cooking_time")
         read_only_fields = fields
 
 
@@ -270,3 +440,21 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
     class Meta:
         model = ShoppingCart
         fields = ("recipe", "user")
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = PrimaryKeyListField(
+        queryset=Recipe.objects.only("id"),
+        allow_empty=False,
+        max_length=100
+    )
+
+
+class RemoveRecipeIdsSerializer(serializers.Serializer):
+    """Id для удаления не проверяются: удаление идемпотентно."""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=100
+    )
@@ -0,0 +1,98 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from recipes.models import (IngredientInRecipe, Ingredients, Recipe,
+                            RecipeDocument, Tags)
+from recipes.signals import author_fields_changed
+from rest_framework.authtoken.models import Token
+
+from .authentication import evict_tokens
+from .recipe_rows import rebuild_documents
+
+User = get_user_model()
+
+
+def rebuild_on_commit(recipe_ids):
+    if recipe_ids:
+        transaction.on_commit(lambda: rebuild_documents(recipe_ids))
+
+
+def invalidate_on_commit(**lookup):
+    # Изменение тэга, ингредиента или автора затрагивает много рецептов:
+    # их документы удаляются и собираются заново при чтении.
+    transaction.on_commit(
+        lambda: RecipeDocument.objects.filter(**lookup).delete()
+    )
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    key = instance.key
+    transaction.on_commit(lambda: evict_tokens([key]))
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created=False, raw=False, **kwargs):
+    # Пароль, активность и остальные поля пользователя кэшируются вместе
+    # с токеном, поэтому любое сохранение сбрасывает его токены.
+    if created or raw:
+        return
+    keys = list(
+        Token.objects.filter(user_id=instance.pk).values_list(
+            "key", flat=True
+        )
+    )
+    if keys:
+        transaction.on_commit(lambda: evict_tokens(keys))
+
+
+@receiver(post_save, sender=User)
+def author_saved(sender, instance, **kwargs):
+    if author_fields_changed(instance):
+        invalidate_on_commit(recipe__author=instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        rebuild_on_commit([instance.pk])
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+@receiver(post_delete, sender=IngredientInRecipe)
+def recipe_ingredient_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        rebuild_on_commit([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set,
+                        **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            rebuild_on_commit([instance.pk])
+    elif action in ("post_add", "post_remove"):
+        rebuild_on_commit(list(pk_set))
+    elif action == "pre_clear":
+        rebuild_on_commit(
+            list(instance.recipes.values_list("pk", flat=True))
+        )
+
+
+@receiver(post_save, sender=Tags)
+def tag_saved(sender, instance, created=False, raw=False, **kwargs):
+    if not (created or raw):
+        invalidate_on_commit(recipe__tags=instance.pk)
+
+
+@receiver(pre_delete, sender=Tags)
+def tag_deleted(sender, instance, **kwargs):
+    rebuild_on_commit(list(instance.recipes.values_list("pk", flat=True)))
+
+
+@receiver(post_save, sender=Ingredients)
+def ingredient_saved(sender, instance, created=False, raw=False, **kwargs):
+    if not (created or raw):
+        invalidate_on_commit(recipe__recipe__ingredient=instance.pk)
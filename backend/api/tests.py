@@ -0,0 +1,899 @@
+import base64
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from foodgram.asgi import application
+from PIL import Image
+from recipes.cache import (RECIPES_VERSION, TAGS_VERSION, USERS_VERSION,
+                           bump_version, get_versions)
+from recipes.images import (VARIANTS_DIR, build_in_background,
+                            image_executor, refresh_image_variants)
+from recipes.indexes import tag_snapshot
+from recipes.models import (Favourite, IngredientInRecipe, Ingredients,
+                            Recipe, RecipeDocument, ShoppingCart,
+                            ShoppingCartTotal, Tags)
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import (APIClient, APIRequestFactory,
+                                 force_authenticate)
+from users.models import Follow, User
+
+from .recipe_rows import (USER_FLAGS, get_document, recipe_rows,
+                          render_document, serialize_recipe_rows,
+                          store_documents, user_subscriptions)
+from .pagination import RecipePagination
+from .serializers import RecipeListSerializer
+from .views import RecipeViewSet
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def png_file(name="recipe.png"):
+    buffer = BytesIO()
+    Image.new("RGB", (64, 32), (255, 0, 0)).save(buffer, "PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), "image/png")
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeTestCase(TestCase):
+    """Рецепты с изображением и без, с одним и несколькими тэгами."""
+
+    factory = APIRequestFactory()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader, cls.other = [
+            User.objects.create(
+                username=name,
+                email=f"{name}@example.com",
+                first_name="Имя",
+                last_name="Фамилия",
+            )
+            for name in ("author", "reader", "other")
+        ]
+        breakfast = Tags.objects.create(
+            name="Завтрак", color="#E26C2D", slug="breakfast"
+        )
+        lunch = Tags.objects.create(
+            name="Обед", color="#49B64E", slug="lunch"
+        )
+        salt, flour, water = [
+            Ingredients.objects.create(name=name, measurement_unit=unit)
+            for name, unit in (("соль", "г"), ("мука", "кг"), ("вода", "мл"))
+        ]
+        cls.with_image = Recipe.objects.create(
+            author=cls.author,
+            name="Блины",
+            text="Смешать и пожарить",
+            cooking_time=30,
+            image=png_file(),
+        )
+        refresh_image_variants(cls.with_image)
+        cls.with_image.tags.set([breakfast, lunch])
+        IngredientInRecipe.objects.bulk_create([
+            IngredientInRecipe(
+                recipe=cls.with_image, ingredient=flour, amount=1
+            ),
+            IngredientInRecipe(
+                recipe=cls.with_image, ingredient=water, amount=500
+            ),
+            IngredientInRecipe(
+                recipe=cls.with_image, ingredient=salt, amount=5
+            ),
+        ])
+        cls.without_image = Recipe.objects.create(
+            author=cls.other,
+            name="Вода",
+            text="Налить",
+            cooking_time=1,
+        )
+        cls.without_image.tags.set([lunch])
+        IngredientInRecipe.objects.create(
+            recipe=cls.without_image, ingredient=water, amount=200
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Favourite.objects.create(user=cls.reader, recipe=cls.with_image)
+        ShoppingCart.objects.create(
+            user=cls.reader, recipe=cls.without_image
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # Версии в кэше переживают откат БД между тестами.
+        cache.clear()
+        bump_version(TAGS_VERSION)
+
+    def get_view(self, user=None, query=""):
+        request = self.factory.get("/api/recipes/" + query)
+        if user is not None:
+            force_authenticate(request, user=user)
+        view = RecipeViewSet(
+            action_map={"get": "list"}, args=(), kwargs={}, format_kwarg=None
+        )
+        view.request = view.initialize_request(request)
+        return view
+
+
+class RecipeRowsContractTest(RecipeTestCase):
+    """Строки рецептов отдают те же байты, что и ``RecipeListSerializer``."""
+
+    def render_both(self, user=None, query=""):
+        view = self.get_view(user, query)
+        queryset = view.filter_queryset(view.get_queryset())
+        expected = JSONRenderer().render(RecipeListSerializer(
+            view.paginate_queryset(queryset),
+            many=True,
+            context={"request": view.request},
+        ).data)
+        actual = JSONRenderer().render(serialize_recipe_rows(
+            view.paginate_queryset(recipe_rows(queryset)),
+            view.request,
+            user_subscriptions(view.request.user),
+        ))
+        return expected, actual
+
+    def test_anonymous(self):
+        for query in ("", "?cursor=", "?tags=lunch", "?search=вода"):
+            with self.subTest(query=query):
+                expected, actual = self.render_both(query=query)
+                self.assertEqual(actual, expected)
+
+    def test_signed_in(self):
+        for user in (self.reader, self.author, self.other):
+            for query in ("", "?ordering=popular", "?is_favorited=1"):
+                with self.subTest(user=user.username, query=query):
+                    expected, actual = self.render_both(user, query)
+                    self.assertEqual(actual, expected)
+
+    def test_flags_are_rendered(self):
+        _, actual = self.render_both(self.reader)
+        self.assertIn(b'"is_favorited":true', actual)
+        self.assertIn(b'"is_in_shopping_cart":true', actual)
+        self.assertIn(b'"is_subscribed":true', actual)
+
+    def test_recipe_without_image(self):
+        query = f"?author={self.other.pk}"
+        expected, actual = self.render_both(self.reader, query)
+        self.assertEqual(actual, expected)
+        self.assertIn(b'"image":null', actual)
+
+    def test_several_tags_and_ingredients(self):
+        query = f"?author={self.author.pk}"
+        expected, actual = self.render_both(self.reader, query)
+        self.assertEqual(actual, expected)
+        self.assertIn(b'"slug":"breakfast"', actual)
+        self.assertIn(b'"slug":"lunch"', actual)
+        self.assertEqual(actual.count(b'"measurement_unit"'), 3)
+
+
+class RecipeDocumentTest(RecipeTestCase):
+    """Сохранённые документы рецептов и их вывод."""
+
+    def render_both(self, recipe, user=None):
+        view = self.get_view(user)
+        instance = view.get_queryset().get(pk=recipe.pk)
+        expected = JSONRenderer().render(RecipeListSerializer(
+            instance, context={"request": view.request}
+        ).data)
+        flags = [
+            (name, getattr(instance, name))
+            for name in USER_FLAGS
+            if hasattr(instance, name)
+        ]
+        actual = JSONRenderer().render(render_document(
+            get_document(recipe.pk),
+            view.request,
+            user_subscriptions(view.request.user),
+            flags,
+        ))
+        return expected, actual
+
+    def test_render_document_matches_serializer(self):
+        for recipe in (self.with_image, self.without_image):
+            for user in (None, self.reader, self.other):
+                with self.subTest(recipe=recipe.name, user=user):
+                    expected, actual = self.render_both(recipe, user)
+                    self.assertEqual(actual, expected)
+
+    def test_get_document_stores_missing_document(self):
+        document = get_document(self.with_image.pk)
+        self.assertEqual(document["id"], self.with_image.pk)
+        self.assertTrue(
+            RecipeDocument.objects.filter(
+                recipe_id=self.with_image.pk
+            ).exists()
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(get_document(self.with_image.pk), document)
+
+    def test_get_document_of_missing_recipe_writes_nothing(self):
+        missing = Recipe.objects.order_by("-pk").first().pk + 1
+        with self.assertNumQueries(2):
+            self.assertIsNone(get_document(missing))
+        self.assertFalse(RecipeDocument.objects.exists())
+
+    def test_document_built_before_a_change_is_rebuilt(self):
+        store_documents([self.without_image.pk])
+        # Изменение зафиксировано, а устаревший документ остался в БД.
+        Tags.objects.filter(slug="lunch").update(name="Ужин")
+        bump_version(TAGS_VERSION)
+        document = get_document(self.without_image.pk)
+        self.assertEqual(
+            [tag["name"] for tag in document["tags"]], ["Ужин"]
+        )
+        Recipe.objects.filter(pk=self.without_image.pk).update(
+            name="Чай", updated_at=timezone.now()
+        )
+        self.assertEqual(get_document(self.without_image.pk)["name"], "Чай")
+        with self.assertNumQueries(1):
+            get_document(self.without_image.pk)
+
+    def test_stored_document_reads_tags_from_database(self):
+        tag_snapshot.rows()
+        Tags.objects.filter(slug="lunch").update(name="Ужин")
+        document, = store_documents([self.without_image.pk])
+        self.assertEqual(
+            [tag["name"] for tag in document["tags"]], ["Ужин"]
+        )
+
+
+class AsgiTest(RecipeTestCase):
+    """Ответы приложения ASGI."""
+
+    def asgi_get(self, path, user):
+        token, _ = Token.objects.get_or_create(user=user)
+        return async_to_sync(self.communicate)({
+            "type": "http",
+            "method": "GET",
+            "path": path,
+            "query_string": b"",
+            "headers": [
+                (b"host", b"testserver"),
+                (b"authorization", f"Token {token.key}".encode()),
+            ],
+        })
+
+    async def communicate(self, scope):
+        communicator = ApplicationCommunicator(application, scope)
+        await communicator.send_input({"type": "http.request"})
+        start = await communicator.receive_output()
+        body = b""
+        while True:
+            message = await communicator.receive_output()
+            body += message.get("body", b"")
+            if not message.get("more_body"):
+                return start["status"], body
+
+    def test_download_shopping_cart(self):
+        status, body = self.asgi_get(
+            "/api/recipes/download_shopping_cart/", self.reader
+        )
+        self.assertEqual(status, 200)
+        self.assertIn("- вода(мл) - 200".encode(), body)
+
+
+class ShoppingListDownloadTest(RecipeTestCase):
+    """Выгрузка списка покупок в разных форматах."""
+
+    def download(self, query=""):
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        response = client.get(
+            "/api/recipes/download_shopping_cart/" + query
+        )
+        self.assertEqual(response.status_code, 200)
+        return response, b"".join(response.streaming_content)
+
+    def test_text_by_default(self):
+        response, body = self.download()
+        self.assertEqual(
+            response["Content-Type"], "text/plain; charset=utf-8"
+        )
+        self.assertIn("- вода(мл) - 200".encode(), body)
+
+    def test_csv(self):
+        response, body = self.download("?format=csv")
+        self.assertEqual(
+            response["Content-Disposition"],
+            'attachment; filename="foodgram_shopping_cart.csv"'
+        )
+        self.assertIn("вода,мл,200".encode(), body)
+
+    def test_pdf(self):
+        response, body = self.download("?format=pdf")
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertEqual(
+            response["Content-Disposition"],
+            'attachment; filename="foodgram_shopping_cart.pdf"'
+        )
+        self.assertTrue(body.startswith(b"%PDF"))
+
+    def test_unknown_format(self):
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        response = client.get(
+            "/api/recipes/download_shopping_cart/?format=doc"
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class TokenCacheTest(RecipeTestCase):
+    """Кэш пользователей по токену."""
+
+    def setUp(self):
+        super().setUp()
+        self.reader.set_password("password")
+        self.reader.save()
+        self.client = APIClient()
+        response = self.client.post(
+            "/api/auth/token/login/",
+            {"email": self.reader.email, "password": "password"},
+        )
+        self.token = response.data["auth_token"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {self.token}")
+
+    def test_cached_token_skips_database(self):
+        self.assertEqual(self.client.get("/api/tags/").status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get("/api/tags/").status_code, 200)
+
+    def test_logout_rejects_token(self):
+        self.assertEqual(self.client.get("/api/users/me/").status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post("/api/auth/token/logout/")
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get("/api/users/me/").status_code, 401)
+
+    def test_deactivation_rejects_token(self):
+        self.assertEqual(self.client.get("/api/users/me/").status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reader.is_active = False
+            self.reader.save()
+        self.assertEqual(self.client.get("/api/users/me/").status_code, 401)
+
+
+class AuthorFilterTest(RecipeTestCase):
+    """Проверка ``?author=`` по кэшированному множеству авторов."""
+
+    def get(self, author):
+        return APIClient().get(f"/api/recipes/?author={author}")
+
+    def test_author(self):
+        response = self.get(self.author.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [recipe["id"] for recipe in response.data["results"]],
+            [self.with_image.pk],
+        )
+
+    def test_user_without_recipes(self):
+        response = self.get(self.reader.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"], [])
+
+    def test_unknown_author(self):
+        missing = User.objects.order_by("-pk").first().pk + 1
+        for value in (missing, "abc"):
+            with self.subTest(value=value):
+                response = self.get(value)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("author", response.data)
+
+    def test_deleted_author(self):
+        self.assertEqual(self.get(self.other.pk).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.delete()
+        self.assertEqual(self.get(self.other.pk).status_code, 400)
+
+
+class RecipePaginationTest(RecipeTestCase):
+    """Курсорный режим ``RecipePagination``."""
+
+    def test_next_cursor_after_page_recipes_were_deleted(self):
+        keys = sorted(
+            Recipe.objects.values_list("pub_date", "id"), reverse=True
+        )
+        paginator = RecipePagination()
+        paginator.page_size = 1
+
+        def fetch_objects(ids):
+            Recipe.objects.filter(pk__in=ids).delete()
+            return recipe_rows(Recipe.objects.filter(pk__in=ids))
+
+        page = paginator.paginate_keys(
+            self.get_view(query="?cursor=").request,
+            lambda position, limit: keys[:limit],
+            fetch_objects,
+        )
+        self.assertEqual(page, [])
+        cursor, = parse_qs(urlparse(paginator.get_next_link()).query)[
+            "cursor"
+        ]
+        self.assertEqual(paginator.decode_cursor(cursor), keys[0])
+
+    def test_cursor_rejects_reordering_params(self):
+        for query in ("?cursor=&search=вода", "?cursor=&ordering=popular"):
+            with self.subTest(query=query):
+                response = APIClient().get("/api/recipes/" + query)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("cursor", response.data)
+
+
+class RecipeRelationsTest(RecipeTestCase):
+    """Избранное и корзина: одиночные и пакетные переключения."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.other)
+
+    def counters(self, recipe):
+        recipe.refresh_from_db()
+        return recipe.favorites_count, recipe.shopping_carts_count
+
+    def test_repeat_toggles_keep_counters(self):
+        recipe = self.with_image
+        url = f"/api/recipes/{recipe.pk}/"
+        self.assertEqual(self.counters(recipe), (1, 0))
+        for name, status_codes in (
+            ("favorite", (201, 400)),
+            ("shopping_cart", (201, 400)),
+        ):
+            for status_code in status_codes:
+                response = self.client.post(url + name + "/")
+                self.assertEqual(response.status_code, status_code)
+        self.assertEqual(self.counters(recipe), (2, 1))
+        for name in ("favorite", "shopping_cart"):
+            for status_code in (204, 400):
+                response = self.client.delete(url + name + "/")
+                self.assertEqual(response.status_code, status_code)
+        self.assertEqual(self.counters(recipe), (1, 0))
+
+    def test_bulk_add_rejects_unknown_recipes(self):
+        missing = Recipe.objects.order_by("-pk").first().pk + 1
+        response = self.client.post(
+            "/api/recipes/favorite/bulk/",
+            {"recipes": [self.with_image.pk, missing]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.counters(self.with_image), (1, 0))
+
+    def test_bulk_delete_skips_unknown_recipes(self):
+        ids = [self.with_image.pk, self.without_image.pk]
+        response = self.client.post(
+            "/api/recipes/shopping_cart/bulk/", {"recipes": ids},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(sorted(response.data["added"]), sorted(ids))
+        missing = Recipe.objects.order_by("-pk").first().pk + 1
+        for removed in (ids, []):
+            response = self.client.delete(
+                "/api/recipes/shopping_cart/bulk/",
+                {"recipes": ids + [missing]},
+                format="json",
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(sorted(response.data["removed"]), removed)
+        self.assertEqual(self.counters(self.with_image), (1, 0))
+        self.assertEqual(self.counters(self.without_image), (0, 1))
+
+
+class FeedCacheTest(RecipeTestCase):
+    """Общая закэшированная страница и флаги пользователя."""
+
+    def test_cached_page_has_user_flags(self):
+        client = APIClient()
+        self.assertEqual(client.get("/api/recipes/").status_code, 200)
+        client.force_authenticate(self.reader)
+        response = client.get("/api/recipes/")
+        recipes = {recipe["id"]: recipe for recipe in response.data["results"]}
+        with_image = recipes[self.with_image.pk]
+        without_image = recipes[self.without_image.pk]
+        self.assertTrue(with_image["is_favorited"])
+        self.assertFalse(with_image["is_in_shopping_cart"])
+        self.assertTrue(with_image["author"]["is_subscribed"])
+        self.assertFalse(without_image["is_favorited"])
+        self.assertTrue(without_image["is_in_shopping_cart"])
+        self.assertFalse(without_image["author"]["is_subscribed"])
+
+
+class RecipeImageTest(RecipeTestCase):
+    """Уменьшенные копии изображений рецептов."""
+
+    def variant_files(self):
+        directory = os.path.join(MEDIA_ROOT, VARIANTS_DIR)
+        if not os.path.isdir(directory):
+            return set()
+        return set(os.listdir(directory))
+
+    def test_narrow_image_shares_variant_files(self):
+        variants = self.with_image.image_variants
+        self.assertEqual(variants["thumbnail"]["width"], 64)
+        self.assertEqual(variants["card"], variants["thumbnail"])
+        self.assertEqual(variants["full"], variants["thumbnail"])
+
+    def test_variants_are_built_after_commit(self):
+        recipe = self.without_image
+        before = self.variant_files()
+        with mock.patch.object(image_executor, "submit") as submit:
+            with self.captureOnCommitCallbacks(execute=True):
+                recipe.image = png_file("new.png")
+                recipe.save()
+                submit.assert_not_called()
+        submit.assert_called_once_with(build_in_background, recipe.pk)
+        self.assertEqual(self.variant_files(), before)
+        self.assertTrue(
+            refresh_image_variants(Recipe.objects.get(pk=recipe.pk))
+        )
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_variants["source"], recipe.image.name)
+        self.assertEqual(len(self.variant_files() - before), 2)
+
+    def test_variants_of_replaced_image_are_discarded(self):
+        recipe = Recipe.objects.get(pk=self.without_image.pk)
+        recipe.image = png_file("old.png")
+        before = self.variant_files()
+        self.assertFalse(refresh_image_variants(recipe))
+        self.assertEqual(self.variant_files(), before)
+        self.assertEqual(
+            Recipe.objects.get(pk=recipe.pk).image_variants, {}
+        )
+
+
+class AuthorVersionTest(RecipeTestCase):
+    """Версии рецептов и авторов меняются только с полями автора."""
+
+    def assert_versions_bumped(self, bumped, change):
+        versions = get_versions([RECIPES_VERSION, USERS_VERSION])
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        self.assertEqual(
+            get_versions([RECIPES_VERSION, USERS_VERSION]) != versions,
+            bumped
+        )
+
+    def test_signup_and_password_change_keep_versions(self):
+        def sign_up():
+            User.objects.create_user(
+                username="new", email="new@example.com", password="secret"
+            )
+
+        def change_password():
+            self.reader.set_password("another")
+            self.reader.save()
+
+        for change in (sign_up, change_password):
+            with self.subTest(change=change.__name__):
+                self.assert_versions_bumped(False, change)
+
+    def test_author_name_change_bumps_versions(self):
+        def rename():
+            self.author.first_name = "Другое"
+            self.author.save()
+
+        self.assert_versions_bumped(True, rename)
+
+
+class RecipeWriteTest(RecipeTestCase):
+    """Создание и изменение рецептов автором."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+        self.ingredients = {
+            ingredient.name: ingredient.pk
+            for ingredient in Ingredients.objects.all()
+        }
+
+    def post_recipe(self, ingredients, tags=()):
+        return self.client.post("/api/recipes/", {
+            "name": "Суп",
+            "text": "Сварить",
+            "cooking_time": 10,
+            "tags": list(tags) or [tag_snapshot.rows()[0]["id"]],
+            "ingredients": ingredients,
+        }, format="json")
+
+    def test_unknown_and_duplicate_ingredients_in_one_error(self):
+        salt = self.ingredients["соль"]
+        missing = max(self.ingredients.values()) + 1
+        response = self.post_recipe([
+            {"id": salt, "amount": 1},
+            {"id": salt, "amount": 2},
+            {"id": missing, "amount": 3},
+            {"id": missing + 1, "amount": 4},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["ingredients"], [
+            f"Ингредиенты не найдены: {missing}, {missing + 1}",
+            f"Ингредиенты указаны несколько раз: {salt}",
+        ])
+
+    def test_unknown_tags(self):
+        missing = max(tag["id"] for tag in tag_snapshot.rows()) + 1
+        response = self.post_recipe(
+            [{"id": self.ingredients["соль"], "amount": 1}],
+            tags=[missing, missing + 1],
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.data["tags"],
+            [f"Объекты не найдены: {missing}, {missing + 1}"]
+        )
+
+    def test_validation_queries_do_not_grow_with_ingredients(self):
+        start = max(self.ingredients.values()) + 1
+
+        def count_queries(amount):
+            ingredients = [
+                {"id": pk, "amount": 1} for pk in range(start, start + amount)
+            ]
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(
+                    self.post_recipe(ingredients).status_code, 400
+                )
+            return len(queries)
+
+        count_queries(1)
+        self.assertEqual(count_queries(2), count_queries(30))
+
+    def patch_recipe(self, recipe, **data):
+        return self.client.patch(
+            f"/api/recipes/{recipe.pk}/", data, format="json"
+        )
+
+    def ingredient_rows(self, recipe):
+        return {
+            ingredient_id: (pk, amount)
+            for pk, ingredient_id, amount in recipe.recipe.values_list(
+                "pk", "ingredient_id", "amount"
+            )
+        }
+
+    def test_update_changes_only_the_diff(self):
+        recipe = self.with_image
+        before = self.ingredient_rows(recipe)
+        flour, water, salt = (
+            self.ingredients[name] for name in ("мука", "вода", "соль")
+        )
+        response = self.patch_recipe(recipe, ingredients=[
+            {"id": flour, "amount": 1},
+            {"id": water, "amount": 600},
+        ])
+        self.assertEqual(response.status_code, 200)
+        after = self.ingredient_rows(recipe)
+        self.assertEqual(after[flour], before[flour])
+        self.assertEqual(after[water], (before[water][0], 600))
+        self.assertNotIn(salt, after)
+
+    def test_unchanged_update_writes_nothing(self):
+        recipe = self.with_image
+        recipe.refresh_from_db()
+        with recipe.image.open("rb"):
+            image = base64.b64encode(recipe.image.read()).decode()
+        updated_at = recipe.updated_at
+        response = self.patch_recipe(
+            recipe,
+            name=recipe.name,
+            tags=list(recipe.tags.values_list("pk", flat=True)),
+            ingredients=[
+                {"id": ingredient_id, "amount": amount}
+                for ingredient_id, (_, amount)
+                in self.ingredient_rows(recipe).items()
+            ],
+            image=f"data:image/png;base64,{image}",
+        )
+        self.assertEqual(response.status_code, 200)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.updated_at, updated_at)
+        self.assertEqual(recipe.image.name, self.with_image.image.name)
+
+
+class ShoppingCartTotalTest(RecipeTestCase):
+    """Итоги списка покупок совпадают с суммой по корзине."""
+
+    def setUp(self):
+        super().setUp()
+        self.reader_client = APIClient()
+        self.reader_client.force_authenticate(self.reader)
+        self.author_client = APIClient()
+        self.author_client.force_authenticate(self.author)
+
+    def assert_totals(self):
+        expected = dict(
+            IngredientInRecipe.objects.filter(
+                recipe__shopping_cart_recipe__user=self.reader
+            ).values("ingredient").annotate(
+                total=Sum("amount")
+            ).values_list("ingredient", "total")
+        )
+        self.assertEqual(
+            dict(ShoppingCartTotal.objects.filter(
+                user=self.reader
+            ).values_list("ingredient_id", "amount")),
+            expected,
+        )
+        summary = self.reader_client.get(
+            "/api/recipes/shopping_cart/summary/"
+        )
+        self.assertEqual(summary.status_code, 200)
+        self.assertEqual(len(summary.data), len(expected))
+
+    def test_totals_follow_cart_and_recipe_changes(self):
+        self.assert_totals()
+        recipe = self.with_image
+        response = self.reader_client.post(
+            f"/api/recipes/{recipe.pk}/shopping_cart/"
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assert_totals()
+        flour, water = (
+            Ingredients.objects.get(name=name).pk for name in ("мука", "вода")
+        )
+        response = self.author_client.patch(
+            f"/api/recipes/{recipe.pk}/",
+            {"ingredients": [
+                {"id": flour, "amount": 3},
+                {"id": water, "amount": 100},
+            ]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assert_totals()
+        response = self.author_client.delete(f"/api/recipes/{recipe.pk}/")
+        self.assertEqual(response.status_code, 204)
+        self.assert_totals()
+        response = self.reader_client.delete(
+            f"/api/recipes/{self.without_image.pk}/shopping_cart/"
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(
+            ShoppingCartTotal.objects.filter(user=self.reader).exists()
+        )
+
+
+class ConditionalGetTest(RecipeTestCase):
+    """ETag и ответ 304 для тэгов и рецептов."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def assert_not_modified(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        return etag
+
+    def assert_modified(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_tags(self):
+        tag = Tags.objects.get(slug="lunch")
+        for url in ("/api/tags/", f"/api/tags/{tag.pk}/"):
+            with self.subTest(url=url):
+                etag = self.assert_not_modified(url)
+                with self.captureOnCommitCallbacks(execute=True):
+                    tag.name = f"Ужин {url}"
+                    tag.save()
+                self.assert_modified(url, etag)
+
+    def test_recipe_changes(self):
+        recipe = self.with_image
+        for url in ("/api/recipes/", f"/api/recipes/{recipe.pk}/"):
+            with self.subTest(url=url):
+                etag = self.assert_not_modified(url)
+                with self.captureOnCommitCallbacks(execute=True):
+                    recipe.refresh_from_db()
+                    recipe.name = f"Оладьи {url}"
+                    recipe.save()
+                self.assert_modified(url, etag)
+
+    def test_user_flags_change_etag(self):
+        self.client.force_authenticate(self.other)
+        url = "/api/recipes/"
+        etag = self.assert_not_modified(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                f"/api/recipes/{self.with_image.pk}/favorite/"
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assert_modified(url, etag)
+
+    def test_popular_ordering_expires(self):
+        url = "/api/recipes/?ordering=popular"
+        with mock.patch("api.etags.time.time", return_value=0):
+            etag = self.assert_not_modified(url)
+        with mock.patch(
+            "api.etags.time.time", return_value=settings.FEED_CACHE_TIMEOUT
+        ):
+            self.assert_modified(url, etag)
+
+
+class UserListTest(RecipeTestCase):
+    """Авторы в списке рецептов и страница подписок."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def count_queries(self, url):
+        # Без кэша страница каждый раз собирается заново.
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response.data["results"]
+
+    def add_authors(self, amount):
+        authors = []
+        for number in range(amount):
+            author = User.objects.create(
+                username=f"extra{number}", email=f"extra{number}@example.com"
+            )
+            Follow.objects.create(user=self.reader, author=author)
+            for _ in range(2):
+                Recipe.objects.create(
+                    author=author, name="Чай", text="Заварить",
+                    cooking_time=5
+                )
+            authors.append(author)
+        return authors
+
+    def test_is_subscribed_costs_no_queries_per_recipe(self):
+        few, recipes = self.count_queries("/api/recipes/")
+        authors = self.add_authors(2)
+        many, recipes = self.count_queries("/api/recipes/")
+        self.assertEqual(few, many)
+        followed = {self.author.pk, *(author.pk for author in authors)}
+        for recipe in recipes:
+            self.assertEqual(
+                recipe["author"]["is_subscribed"],
+                recipe["author"]["id"] in followed,
+            )
+
+    def test_subscriptions_cost_fixed_queries(self):
+        self.add_authors(2)
+        url = "/api/users/subscriptions/?recipes_limit=1&limit="
+        few, _ = self.count_queries(url + "1")
+        many, authors = self.count_queries(url + "3")
+        self.assertEqual(few, many)
+        self.assertEqual(len(authors), 3)
+        for author in authors:
+            user = User.objects.get(pk=author["id"])
+            self.assertEqual(author["count_recipes"], user.recipes.count())
+            self.assertEqual(len(author["recipes"]), 1)
+            self.assertTrue(author["is_subscribed"])
+
+    def test_recipes_limit_must_be_a_number(self):
+        response = self.client.get(
+            "/api/users/subscriptions/?recipes_limit=many"
+        )
+        self.assertEqual(response.status_code, 400)
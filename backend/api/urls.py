@@ -1,9 +1,12 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 from django.contrib.auth import get_user_model
 from users.views import CustomUserViewSet
 
-from .views import IngredientsViewSet, RecipeViewSet, TagsViewsSet
+from .async_views import async_read
+from .views import (IngredientsViewSet, MetricsView, RecipeViewSet,
+                    TagsViewsSet)
 
 
 User = get_user_model()
@@ -15,8 +18,17 @@ router_v1.register("tags", TagsViewsSet, basename="tags")
 router_v1.register("ingredients", IngredientsViewSet, basename="ingredients")
 router_v1.register("users", CustomUserViewSet, basename="users")
 
+ASYNC_READ_ROUTES = ("recipes-list", "recipes-detail", "ingredients-list")
+
+router_urls = router_v1.urls
+if settings.ASYNC_READ_VIEWS:
+    for pattern in router_urls:
+        if pattern.name in ASYNC_READ_ROUTES:
+            pattern.callback = async_read(pattern.callback)
+
 urlpatterns = [
-    path("", include(router_v1.urls)),
+    path("_metrics", MetricsView.as_view(), name="metrics"),
+    path("", include(router_urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
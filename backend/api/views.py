@@ -1,24 +1,51 @@
-from django.db.models import Exists, OuterRef, Sum
-from django.http import HttpResponse
+from django.db.models import Exists, OuterRef, Prefetch
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import permissions, status
 from rest_framework.decorators import action
 from rest_framework.permissions import SAFE_METHODS
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet
-from datetime import datetime
 
-from recipes.models import (Favourite, IngredientInRecipe, Ingredients, Recipe,
-                            ShoppingCart, Tags)
+from recipes.cache import (INGREDIENTS_VERSION, RECIPES_VERSION, TAGS_VERSION,
+                           USERS_VERSION)
+from recipes.feed import timeline
+from recipes.indexes import ingredient_index, tag_snapshot
+from recipes.models import (Favourite, IngredientInRecipe, Ingredients,
+                            Recipe, ShoppingCart, ShoppingCartTotal, Tags)
+from recipes.relations import add_recipes, remove_recipes
+from users.models import Follow
+from .etags import ConditionalGetMixin, make_etag
+from .feed_cache import get_cached_page, is_cacheable, overlay_user_flags
 from .filters import IngredientFilter, RecipeFilter
+from .metrics import registry
+from .pagination import RecipePagination
 from .permissions import IsAuthorOrReadOnly
-from .serializers import (IngredientsSerializer, RecipePOSTUPDELSerializer,
-                          RecipeListSerializer, ShoppingCartSerializer,
-                          TagsSerializer, RecipeInfoSerializer)
+from .recipe_rows import (USER_FLAGS, get_document, recipe_rows,
+                          render_document, serialize_recipe_rows,
+                          user_subscriptions)
+from .renderers import (SHOPPING_LIST_RENDERERS, PlainTextRenderer,
+                        ShoppingListNegotiation)
+from .serializers import (IngredientsSerializer, RecipeIdsSerializer,
+                          RecipeInfoSerializer, RecipeListSerializer,
+                          RecipePOSTUPDELSerializer,
+                          RemoveRecipeIdsSerializer, ShoppingCartSerializer,
+                          ShoppingCartTotalSerializer, TagsSerializer)
 
+STREAM_CHUNK_SIZE = 500
 
-class IngredientsViewSet(ModelViewSet):
+
+class MetricsView(APIView):
+    permission_classes = (permissions.IsAdminUser,)
+    renderer_classes = (PlainTextRenderer,)
+
+    def get(self, request):
+        return Response(registry.render())
+
+
+class IngredientsViewSet(ConditionalGetMixin, ModelViewSet):
     queryset = Ingredients.objects.all()
     serializer_class = IngredientsSerializer
     pagination_class = None
@@ -26,51 +53,168 @@ class IngredientsViewSet(ModelViewSet):
     filterset_class = IngredientFilter
     search_fields = ("^name", )
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    list_versions = (INGREDIENTS_VERSION, )
+    replica_reads = True
+
+    def build_list(self, request, *args, **kwargs):
+        return Response(
+            ingredient_index.search(request.query_params.get("name", ""))
+        )
 
 
-class TagsViewsSet(ModelViewSet):
+class TagsViewsSet(ConditionalGetMixin, ModelViewSet):
     queryset = Tags.objects.all()
     serializer_class = TagsSerializer
     pagination_class = None
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    list_versions = (TAGS_VERSION, )
+    replica_reads = True
 
+    def get_tag_id(self):
+        try:
+            return int(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except ValueError:
+            raise Http404
+
+    def get_object_etag(self, request):
+        pk = self.get_tag_id()
+        if tag_snapshot.get(pk) is None:
+            return None
+        return make_etag(
+            "object",
+            pk,
+            *self.get_etag_parts(request, self.list_versions)
+        )
 
-class RecipeViewSet(ModelViewSet):
+    def build_list(self, request, *args, **kwargs):
+        return Response(tag_snapshot.rows())
+
+    def build_object(self, request, *args, **kwargs):
+        tag = tag_snapshot.get(self.get_tag_id())
+        if tag is None:
+            raise Http404
+        return Response(tag)
+
+
+class RecipeViewSet(ConditionalGetMixin, ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = RecipePOSTUPDELSerializer
+    pagination_class = RecipePagination
     filter_backends = (DjangoFilterBackend, )
     permission_classes = (IsAuthorOrReadOnly,)
     filterset_class = RecipeFilter
+    list_versions = (RECIPES_VERSION, TAGS_VERSION, INGREDIENTS_VERSION)
+    object_versions = (USERS_VERSION, TAGS_VERSION, INGREDIENTS_VERSION)
+    user_dependent = True
+    counter_orderings = ("popular",)
+    replica_reads = True
 
     def get_serializer_class(self):
         if self.request.method in SAFE_METHODS == "GET":
             RecipeListSerializer
         return RecipePOSTUPDELSerializer
 
-    def get_queryset(self):
-        queryset = Recipe.objects.select_related(
+    def get_base_queryset(self):
+        return Recipe.objects.select_related(
             "author"
         ).prefetch_related(
-            "ingredients",
+            Prefetch(
+                "recipe",
+                queryset=IngredientInRecipe.objects.select_related(
+                    "ingredient"
+                ).order_by("id")
+            ),
             "tags"
         )
+
+    def get_queryset(self):
+        if self.request.user.is_authenticated:
+            return self.annotate_user_flags(self.get_base_queryset())
+        return self.get_base_queryset()
+
+    def annotate_user_flags(self, queryset):
         user = self.request.user
-        if user.is_authenticated:
-            queryset = queryset.annotate(
-                is_favorited=Exists(
-                    Favourite.objects.filter(
-                        user=user,
-                        recipe=OuterRef("pk")
-                    )
-                ),
-                is_in_shopping_cart=Exists(
-                    ShoppingCart.objects.filter(
-                        user=user,
-                        recipe=OuterRef("pk")
-                    )
+        return queryset.annotate(
+            is_favorited=Exists(
+                Favourite.objects.filter(
+                    user=user,
+                    recipe=OuterRef("pk")
                 )
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(
+                    user=user,
+                    recipe=OuterRef("pk")
+                )
+            )
+        )
+
+    def build_object(self, request, *args, **kwargs):
+        try:
+            pk = int(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except ValueError:
+            raise Http404
+        document = get_document(pk)
+        if document is None:
+            raise Http404
+        if request.user.is_anonymous:
+            return Response(render_document(document, request, set()))
+        flags = self.annotate_user_flags(
+            Recipe.objects.filter(pk=pk)
+        ).annotate(
+            is_subscribed=Exists(
+                Follow.objects.filter(
+                    user=request.user,
+                    author=OuterRef("author")
+                )
+            )
+        ).values("is_subscribed", *USER_FLAGS).first()
+        if flags is None:
+            raise Http404
+        return Response(render_document(
+            document,
+            request,
+            {document["author"]["id"]} if flags["is_subscribed"] else set(),
+            [(name, flags[name]) for name in USER_FLAGS]
+        ))
+
+    def build_list(self, request, *args, **kwargs):
+        if not is_cacheable(request):
+            return self.build_page(
+                self.get_queryset(), user_subscriptions(request.user)
+            )
+        data = get_cached_page(
+            request,
+            lambda: self.build_page(self.get_base_queryset(), set()).data
+        )
+        if request.user.is_authenticated:
+            data = overlay_user_flags(data, request.user)
+        return Response(data)
+
+    def build_page(self, queryset, subscriptions):
+        rows = self.paginate_queryset(
+            recipe_rows(self.filter_queryset(queryset))
+        )
+        return self.get_paginated_response(
+            serialize_recipe_rows(rows, self.request, subscriptions)
+        )
+
+    @action(
+        methods=["GET"],
+        detail=False,
+        permission_classes=[permissions.IsAuthenticated]
+    )
+    def feed(self, request):
+        page = self.paginator.paginate_keys(
+            request,
+            lambda position, limit: timeline(request.user, position, limit),
+            lambda ids: recipe_rows(self.get_queryset().filter(pk__in=ids))
+        )
+        return self.paginator.get_paginated_response(
+            serialize_recipe_rows(
+                page, request, user_subscriptions(request.user)
             )
-        return queryset
+        )
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -87,20 +231,16 @@ class RecipeViewSet(ModelViewSet):
     )
     def favorite(self, request, pk):
         if request.method == "POST":
-            if Favourite.objects.filter(
-                user=request.user, recipe__id=pk
-            ).exists():
+            recipe = get_object_or_404(Recipe, id=pk)
+            if not add_recipes(Favourite, request.user, [recipe.id]):
                 return Response(
                     {"errors": "Рецепт уже добавлен"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            recipe = get_object_or_404(Recipe, id=pk)
-            Favourite.objects.create(user=request.user, recipe=recipe)
             serializer = RecipeInfoSerializer(recipe)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        if Favourite.objects.filter(user=request.user, recipe__id=pk).exists():
-            Favourite.objects.filter(user=request.user, recipe__id=pk).delete()
+        if remove_recipes(Favourite, request.user, [pk]):
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
@@ -111,57 +251,95 @@ class RecipeViewSet(ModelViewSet):
     )
     def shopping_cart(self, request, pk):
         if request.method == "POST":
-            if ShoppingCart.objects.filter(
-                user=request.user, recipe__id=pk
-            ).exists():
+            recipe = get_object_or_404(Recipe, id=pk)
+            if not add_recipes(ShoppingCart, request.user, [recipe.id]):
                 return Response(
                     {"error": "Рецепт уже добавлен в корзину"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            recipe = get_object_or_404(Recipe, id=pk)
-            instance = ShoppingCart.objects.create(
-                user=request.user,
-                recipe=recipe
+            serializer = ShoppingCartSerializer(
+                ShoppingCart(user=request.user, recipe=recipe)
             )
-            serializer = ShoppingCartSerializer(instance)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        if ShoppingCart.objects.filter(
-            user=request.user, recipe__id=pk
-        ).exists():
-            ShoppingCart.objects.filter(
-                user=request.user, recipe__id=pk
-            ).delete()
+        if remove_recipes(ShoppingCart, request.user, [pk]):
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(status=status.HTTP_400_BAD_REQUEST)
 
+    def bulk_toggle(self, request, model):
+        if request.method == "POST":
+            serializer = RecipeIdsSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            added = add_recipes(model, request.user, [
+                recipe.id for recipe in serializer.validated_data["recipes"]
+            ])
+            return Response({"added": added}, status=status.HTTP_201_CREATED)
+        # Удаляются только существующие связи, неизвестные id пропускаются.
+        serializer = RemoveRecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        removed = remove_recipes(
+            model, request.user, serializer.validated_data["recipes"]
+        )
+        return Response({"removed": removed}, status=status.HTTP_200_OK)
+
+    @action(
+        methods=["POST", "DELETE"],
+        detail=False,
+        url_path="favorite/bulk",
+        url_name="favorite-bulk",
+        permission_classes=[permissions.IsAuthenticated]
+    )
+    def favorite_bulk(self, request):
+        return self.bulk_toggle(request, Favourite)
+
+    @action(
+        methods=["POST", "DELETE"],
+        detail=False,
+        url_path="shopping_cart/bulk",
+        url_name="shopping-cart-bulk",
+        permission_classes=[permissions.IsAuthenticated]
+    )
+    def shopping_cart_bulk(self, request):
+        return self.bulk_toggle(request, ShoppingCart)
+
     @action(
         methods=["GET"],
         detail=False,
+        url_path="shopping_cart/summary",
         permission_classes=[permissions.IsAuthenticated]
     )
+    def shopping_cart_summary(self, request):
+        totals = ShoppingCartTotal.objects.filter(
+            user=request.user
+        ).select_related("ingredient").order_by("ingredient__name")
+        return Response(ShoppingCartTotalSerializer(totals, many=True).data)
+
+    @action(
+        methods=["GET"],
+        detail=False,
+        permission_classes=[permissions.IsAuthenticated],
+        renderer_classes=SHOPPING_LIST_RENDERERS,
+        content_negotiation_class=ShoppingListNegotiation
+    )
     def download_shopping_cart(self, request):
-        ingredients = IngredientInRecipe.objects.select_related(
-            "recipe", "ingredient"
-        )
-        ingredients = IngredientInRecipe.objects.filter(
-            recipe__shopping_cart_recipe__user=request.user
+        ingredients = ShoppingCartTotal.objects.filter(
+            user=request.user
         ).values(
             "ingredient__name",
-            "ingredient__measurement_unit"
-        ).annotate(amount=Sum("amount"))
-        today = datetime.today()
-        shopping_list = (
-            f"Список покупок для: {request.user.get_username()}\n\n"
-            f"Дата: {today:%Y-%m-%d}\n\n"
+            "ingredient__measurement_unit",
+            "amount"
+        ).order_by("ingredient__name")
+        renderer = request.accepted_renderer
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f"{content_type}; charset={renderer.charset}"
+        response = StreamingHttpResponse(
+            renderer.stream(
+                request.user,
+                ingredients.iterator(chunk_size=STREAM_CHUNK_SIZE)
+            ),
+            content_type=content_type
         )
-        shopping_list += '\n'.join([
-            f"- {ingredient['ingredient__name']}"
-            f"({ingredient['ingredient__measurement_unit']})"
-            f" - {ingredient['amount']}"
-            for ingredient in ingredients
-        ])
-        filename = "foodgram_shopping_cart.txt"
-        response = HttpResponse(shopping_list, content_type="text/plain")
-        response["Content-Disposition"] = f"attachment; {filename}"
+        filename = f"foodgram_shopping_cart.{renderer.format}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
         return response
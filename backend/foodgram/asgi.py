@@ -0,0 +1,38 @@
+"""
+ASGI config for foodgram project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
+"""
+
+import os
+
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+os.environ.setdefault('ASYNC_READ_VIEWS', '1')
+
+
+class FoodgramASGIHandler(ASGIHandler):
+    """``ASGIHandler``, читающий потоковые ответы вне цикла событий.
+
+    Django 3.2 перебирает ``streaming_content`` прямо в цикле событий,
+    и ленивый запрос к БД в генераторе падает с
+    ``SynchronousOnlyOperation``. Поэтому тело потокового ответа
+    собирается в том же синхронном потоке, где работало представление.
+    """
+
+    async def send_response(self, response, send):
+        if response.streaming:
+            response.streaming_content = await sync_to_async(
+                list, thread_sensitive=True
+            )(response)
+        await super().send_response(response, send)
+
+
+django.setup(set_prefix=False)
+application = FoodgramASGIHandler()
@@ -0,0 +1,55 @@
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+read_alias = ContextVar("read_alias", default=None)
+
+# Токен только что вошедшего пользователя мог ещё не дойти до реплик.
+PRIMARY_MODELS = {"authtoken.token"}
+
+
+def choose_replica():
+    if not settings.DATABASE_REPLICAS:
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+def reading_from_replica():
+    return read_alias.get() is not None
+
+
+def replica_epoch():
+    """Номер текущего окна ``DB_REPLICA_STICKY_SECONDS``.
+
+    Данные с реплики могут отставать от версий в кэше, поэтому всё, что
+    построено по ним и помечено версией, должно устаревать не позже
+    конца такого окна.
+    """
+    return int(time.time() // max(settings.DB_REPLICA_STICKY_SECONDS, 1))
+
+
+class ReplicaRouter:
+    """Направляет чтение на реплику, выбранную для текущего запроса.
+
+    Реплику выбирает ``api.middleware.ReplicaMiddleware``; запись и любое
+    чтение вне таких запросов (сигналы, команды, миграции) идут в
+    основную БД.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label_lower in PRIMARY_MODELS:
+            return DEFAULT_DB_ALIAS
+        return read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная БД.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -32,6 +32,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.QueryMetricsMiddleware',
+    'api.middleware.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -72,6 +74,61 @@ DATABASES = {
     }
 }
 
+# Реплики только для чтения: через запятую host или host:port, для SQLite
+# пути к файлам. Остальные параметры подключения берутся у основной БД.
+DATABASE_REPLICAS = []
+for number, address in enumerate(
+    filter(None, os.getenv("DB_REPLICAS", default="").split(",")), start=1
+):
+    replica = {**DATABASES["default"], "TEST": {"MIRROR": "default"}}
+    if replica["ENGINE"].endswith("sqlite3"):
+        replica["NAME"] = address.strip()
+    else:
+        host, _, port = address.strip().partition(":")
+        replica["HOST"] = host
+        replica["PORT"] = port or replica["PORT"]
+    DATABASES[f"replica_{number}"] = replica
+    DATABASE_REPLICAS.append(f"replica_{number}")
+
+DATABASE_ROUTERS = ["foodgram.db_router.ReplicaRouter"]
+
+# Сколько секунд после записи клиент читает из основной БД, пока его
+# изменения доходят до реплик.
+DB_REPLICA_STICKY_SECONDS = int(
+    os.getenv("DB_REPLICA_STICKY_SECONDS", default=5)
+)
+
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND",
+            default="django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", default="foodgram"),
+    }
+}
+
+FEED_CACHE_TIMEOUT = int(os.getenv("FEED_CACHE_TIMEOUT", default=60))
+
+# Уменьшенные копии изображений рецептов строятся после фиксации
+# транзакции в фоновом пуле из IMAGE_VARIANT_THREADS потоков.
+IMAGE_VARIANT_THREADS = int(os.getenv("IMAGE_VARIANT_THREADS", default=2))
+
+# Рецепты авторов с таким числом подписчиков не рассылаются по лентам,
+# а подмешиваются при чтении.
+FEED_FANOUT_FOLLOWERS_LIMIT = int(
+    os.getenv("FEED_FANOUT_FOLLOWERS_LIMIT", default=1000)
+)
+
+# Под ASGI (foodgram/asgi.py) чтение рецептов и ингредиентов обслуживают
+# асинхронные представления, запросы к БД выполняются в отдельном пуле.
+ASYNC_READ_VIEWS = os.getenv("ASYNC_READ_VIEWS", default="0") == "1"
+ASYNC_READ_THREADS = int(os.getenv("ASYNC_READ_THREADS", default=16))
+
+# Пользователь по токену кэшируется в общем кэше на TOKEN_CACHE_TIMEOUT
+# секунд; отзыв токена удаляет запись сразу.
+TOKEN_CACHE_TIMEOUT = int(os.getenv("TOKEN_CACHE_TIMEOUT", default=300))
+
 AUTH_USER_MODEL = 'users.User'
 
 
@@ -111,7 +168,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
@@ -142,3 +199,5 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 LANGUAGE_CODE = 'ru'
 
 DIR_DATA_CSV = os.path.join(BASE_DIR, 'data')
+
+SHOPPING_LIST_FONT = os.path.join(BASE_DIR, 'data', 'fonts', 'DejaVuSans.ttf')
@@ -0,0 +1,28 @@
+import os
+
+from dotenv import load_dotenv
+
+# Должно совпадать со значением по умолчанию CACHES в foodgram/settings.py.
+# Настройки Django здесь не загружаются: мастер-процесс передал бы их
+# воркерам до того, как foodgram/asgi.py задаст свои переменные окружения.
+DEFAULT_CACHE_BACKEND = "django.core.cache.backends.locmem.LocMemCache"
+LOCAL_CACHES = (
+    DEFAULT_CACHE_BACKEND,
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def on_starting(server):
+    """Не запускает несколько воркеров без общего кэша.
+
+    Версии кэша сбрасывают индексы и ``tag_snapshot`` во всех воркерах
+    только через общий кэш; с кэшем в памяти процесса остальные воркеры
+    продолжили бы отдавать устаревшие данные.
+    """
+    load_dotenv()
+    backend = os.getenv("CACHE_BACKEND", DEFAULT_CACHE_BACKEND)
+    if server.cfg.workers > 1 and backend in LOCAL_CACHES:
+        raise RuntimeError(
+            f"{backend} не общий для воркеров: задайте CACHE_BACKEND "
+            f"(например, PyMemcacheCache) или запустите один воркер"
+        )
@@ -12,7 +12,7 @@ class RecipeIngredientInline(admin.TabularInline):
 
 class RecipeAdmin(admin.ModelAdmin):
     def added_to_favorites_amount(self, obj):
-        return Favourite.objects.filter(recipe=obj).count()
+        return obj.favorites_count
     added_to_favorites_amount.short_description = "Добавлений в избранное"
 
     list_display = (
@@ -0,0 +1,50 @@
+import time
+
+from django.core.cache import cache
+
+VERSION_KEY = "foodgram:version:{}"
+
+INGREDIENTS_VERSION = "ingredients"
+RECIPES_VERSION = "recipes"
+TAGS_VERSION = "tags"
+USERS_VERSION = "users"
+
+
+def user_version(user_id):
+    """Имя версии данных, зависящих от пользователя (избранное, подписки)."""
+    return f"user:{user_id}"
+
+
+def _initial_version():
+    return int(time.time() * 1000)
+
+
+def get_version(name):
+    """Текущая версия набора данных, общая для всех процессов."""
+    key = VERSION_KEY.format(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial_version(), timeout=None)
+        return cache.get(key)
+    return version
+
+
+def get_versions(names):
+    """Версии нескольких наборов данных за одно обращение к кэшу."""
+    found = cache.get_many([VERSION_KEY.format(name) for name in names])
+    versions = []
+    for name in names:
+        version = found.get(VERSION_KEY.format(name))
+        versions.append(get_version(name) if version is None else version)
+    return versions
+
+
+def bump_version(name):
+    """Помечает закэшированные копии набора данных устаревшими."""
+    key = VERSION_KEY.format(name)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _initial_version()
+        cache.set(key, version, timeout=None)
+        return version
@@ -0,0 +1,73 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def increment(queryset, field, delta=1):
+    """Атомарно изменяет счётчик ``field`` у строк ``queryset``."""
+    if delta < 0:
+        queryset = queryset.filter(**{f"{field}__gte": -delta})
+    return queryset.update(**{field: F(field) + delta})
+
+
+def recount(model, field, related_model, related_field):
+    """Пересчитывает счётчик и возвращает количество исправленных строк."""
+    actual = Coalesce(
+        Subquery(
+            related_model.objects.filter(
+                **{related_field: OuterRef("pk")}
+            ).order_by().values(related_field).annotate(
+                total=Count("pk")
+            ).values("total")
+        ),
+        0
+    )
+    drifted = model.objects.annotate(actual=actual).exclude(
+        **{field: F("actual")}
+    )
+    return model.objects.filter(
+        pk__in=Subquery(drifted.values("pk"))
+    ).update(**{field: actual})
+
+
+def recount_all():
+    """Сверяет все денормализованные счётчики с исходными таблицами."""
+    from recipes.models import Favourite, Recipe, ShoppingCart
+    from users.models import Follow, User
+
+    return {
+        "Recipe.favorites_count": recount(
+            Recipe, "favorites_count", Favourite, "recipe"
+        ),
+        "Recipe.shopping_carts_count": recount(
+            Recipe, "shopping_carts_count", ShoppingCart, "recipe"
+        ),
+        "User.recipes_count": recount(User, "recipes_count", Recipe, "author"),
+        "User.followers_count": recount(
+            User, "followers_count", Follow, "author"
+        ),
+    }
+
+
+class CountersMixin:
+    """Не даёт полному ``save()`` записать устаревшие значения счётчиков.
+
+    Счётчики меняются только через ``increment``, поэтому при сохранении
+    существующей строки без ``update_fields`` обновляются все поля, кроме
+    ``counter_fields``.
+    """
+
+    counter_fields = ()
+
+    def save(self, force_insert=False, force_update=False, using=None,
+             update_fields=None):
+        if (update_fields is None and not force_insert
+                and not self._state.adding):
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred
+            ]
+        super().save(force_insert, force_update, using, update_fields)
@@ -0,0 +1,179 @@
+from django.conf import settings
+from django.db.models import Q
+from users.models import Follow, User
+
+from .models import FeedEntry, FeedPullAuthor, Recipe
+
+BATCH_SIZE = 1000
+
+
+def fanout_limit():
+    return settings.FEED_FANOUT_FOLLOWERS_LIMIT
+
+
+def is_popular(followers_count):
+    return followers_count >= fanout_limit()
+
+
+def write_entries(rows):
+    """Создаёт записи лент из ``(user_id, recipe_id, author_id, pub_date)``."""
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(
+                user_id=user_id,
+                recipe_id=recipe_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for user_id, recipe_id, author_id, pub_date in rows
+        ],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def is_pulled(author_id):
+    return FeedPullAuthor.objects.filter(author_id=author_id).exists()
+
+
+def fan_out(recipe):
+    """Рассылает новый рецепт по лентам подписчиков обычного автора."""
+    if is_pulled(recipe.author_id):
+        return
+    write_entries(
+        (user_id, recipe.pk, recipe.author_id, recipe.pub_date)
+        for user_id in Follow.objects.filter(
+            author_id=recipe.author_id
+        ).values_list("user_id", flat=True).iterator()
+    )
+
+
+def backfill(user_ids, author_id):
+    """Добавляет в ленты ``user_ids`` все рецепты автора."""
+    recipes = list(
+        Recipe.objects.filter(author_id=author_id).values_list(
+            "pk", "pub_date"
+        )
+    )
+    write_entries(
+        (user_id, pk, author_id, pub_date)
+        for user_id in user_ids
+        for pk, pub_date in recipes
+    )
+
+
+def follow_created(user_id, author):
+    if is_popular(author.followers_count):
+        FeedPullAuthor.objects.bulk_create(
+            [FeedPullAuthor(author_id=author.pk)], ignore_conflicts=True
+        )
+    elif not is_pulled(author.pk):
+        backfill([user_id], author.pk)
+
+
+def follow_deleted(user_id, author):
+    """Убирает рецепты автора из ленты отписавшегося пользователя.
+
+    Если у автора стало меньше подписчиков, чем
+    ``FEED_FANOUT_FOLLOWERS_LIMIT``, его рецепты по-прежнему подмешиваются
+    при чтении: разослать их всем подписчикам в запросе на отписку было
+    бы слишком долго, это делает ``fan_out_pulled_authors``.
+    """
+    FeedEntry.objects.filter(user_id=user_id, author_id=author.pk).delete()
+
+
+def fan_out_pulled_authors():
+    """Рассылает рецепты авторов, у которых стало меньше подписчиков.
+
+    Отметка снимается между двумя проходами: рецепт, опубликованный во
+    время первого, попадёт во второй, а после снятия — в ``fan_out``.
+    Возвращает число авторов.
+    """
+    author_ids = list(
+        FeedPullAuthor.objects.filter(
+            author__followers_count__lte=fanout_limit() - 1
+        ).values_list("author_id", flat=True)
+    )
+    for author_id in author_ids:
+        followers = Follow.objects.filter(
+            author_id=author_id
+        ).values_list("user_id", flat=True)
+        backfill(followers, author_id)
+        deleted, _ = FeedPullAuthor.objects.filter(
+            author_id=author_id,
+            author__followers_count__lte=fanout_limit() - 1,
+        ).delete()
+        if deleted:
+            backfill(followers, author_id)
+    return len(author_ids)
+
+
+def after(position, pk_field):
+    if position is None:
+        return Q()
+    pub_date, pk = position
+    return Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, **{
+        f"{pk_field}__lt": pk
+    })
+
+
+def timeline(user, position, limit):
+    """Возвращает до ``limit`` ключей ``(pub_date, id)`` ленты подписок.
+
+    Рецепты обычных авторов читаются из разосланных записей, рецепты
+    авторов из ``FeedPullAuthor`` подмешиваются отдельным запросом по
+    индексу ``(author, pub_date, id)``.
+    """
+    keys = set(
+        FeedEntry.objects.filter(
+            after(position, "recipe"), user=user
+        ).order_by("-pub_date", "-recipe").values_list(
+            "pub_date", "recipe"
+        )[:limit]
+    )
+    popular = list(
+        Follow.objects.filter(
+            user=user,
+            author_id__in=FeedPullAuthor.objects.values("author_id"),
+        ).values_list("author_id", flat=True)
+    )
+    if popular:
+        keys.update(
+            Recipe.objects.filter(
+                after(position, "id"), author_id__in=popular
+            ).order_by("-pub_date", "-id").values_list(
+                "pub_date", "id"
+            )[:limit]
+        )
+    return sorted(keys, reverse=True)[:limit]
+
+
+def rebuild_feed():
+    """Полностью пересобирает ленты подписок; возвращает число записей."""
+    FeedPullAuthor.objects.all().delete()
+    FeedPullAuthor.objects.bulk_create(
+        FeedPullAuthor(author_id=pk)
+        for pk in User.objects.filter(
+            followers_count__gte=fanout_limit()
+        ).values_list("pk", flat=True).iterator()
+    )
+    rows = Recipe.objects.filter(
+        author__followers_count__lt=fanout_limit(),
+        author__following__isnull=False,
+    ).values_list(
+        "author__following__user", "pk", "author_id", "pub_date"
+    ).order_by()
+    FeedEntry.objects.all().delete()
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=user_id,
+                recipe_id=recipe_id,
+                author_id=author_id,
+                pub_date=pub_date,
+            )
+            for user_id, recipe_id, author_id, pub_date in rows.iterator()
+        ),
+        batch_size=BATCH_SIZE,
+    )
+    return FeedEntry.objects.count()
@@ -0,0 +1,148 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image
+
+from .cache import RECIPES_VERSION, bump_version
+from .models import Recipe, RecipeDocument
+
+VARIANTS_DIR = "recipes/static/variants"
+IMAGE_VARIANTS = (
+    ("thumbnail", 160),
+    ("card", 480),
+    ("full", 1200),
+)
+IMAGE_FORMATS = (
+    ("webp", "WEBP", {"quality": 80, "method": 4}),
+    ("jpeg", "JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+)
+
+
+def open_rgb(image):
+    image.open("rb")
+    try:
+        picture = Image.open(image)
+        picture.load()
+    finally:
+        image.close()
+    if picture.mode in ("RGBA", "LA", "P"):
+        picture = picture.convert("RGBA")
+        background = Image.new("RGB", picture.size, (255, 255, 255))
+        background.paste(picture, mask=picture.getchannel("A"))
+        return background
+    return picture.convert("RGB")
+
+
+def resize(picture, width):
+    if picture.width <= width:
+        return picture
+    height = max(1, round(picture.height * width / picture.width))
+    return picture.resize((width, height), Image.LANCZOS)
+
+
+def build_image_variants(image):
+    """Сохраняет уменьшенные копии изображения в WebP и JPEG.
+
+    Возвращает описание вариантов для ``Recipe.image_variants``. Если
+    оригинал не шире варианта, вариант ссылается на файлы предыдущего,
+    а не повторяет их.
+    """
+    picture = open_rgb(image)
+    stem = os.path.splitext(os.path.basename(image.name))[0]
+    variants = {"source": image.name}
+    variant = None
+    for name, width in IMAGE_VARIANTS:
+        resized = resize(picture, width)
+        if variant is not None and variant["width"] == resized.width:
+            variants[name] = variant
+            continue
+        variant = {"width": resized.width}
+        for extension, pil_format, options in IMAGE_FORMATS:
+            buffer = BytesIO()
+            resized.save(buffer, pil_format, **options)
+            variant[extension] = default_storage.save(
+                f"{VARIANTS_DIR}/{stem}_{name}.{extension}",
+                ContentFile(buffer.getvalue())
+            )
+        variants[name] = variant
+    return variants
+
+
+def delete_image_variants(variants):
+    paths = {
+        variants.get(name, {}).get(extension)
+        for name, _ in IMAGE_VARIANTS
+        for extension, _, _ in IMAGE_FORMATS
+    }
+    for path in paths - {None}:
+        default_storage.delete(path)
+
+
+def needs_image_variants(recipe):
+    source = recipe.image.name if recipe.image else None
+    return (recipe.image_variants or {}).get("source") != source
+
+
+@transaction.atomic
+def refresh_image_variants(recipe):
+    """Перестраивает варианты, если изображение рецепта изменилось.
+
+    Варианты сохраняются, только если изображение в БД всё ещё то же,
+    из которого они построены; иначе новые файлы удаляются. Старые
+    файлы удаляются только после фиксации транзакции: при откате в БД
+    останутся ссылки на них.
+    """
+    if not needs_image_variants(recipe):
+        return False
+    old_variants = recipe.image_variants or {}
+    variants = build_image_variants(recipe.image) if recipe.image else {}
+    updated = Recipe.objects.filter(
+        pk=recipe.pk, image=recipe.image.name
+    ).update(
+        image_variants=variants,
+        updated_at=timezone.now()
+    )
+    if not updated:
+        delete_image_variants(variants)
+        return False
+    recipe.image_variants = variants
+    RecipeDocument.objects.filter(recipe_id=recipe.pk).delete()
+    transaction.on_commit(lambda: delete_image_variants(old_variants))
+    transaction.on_commit(lambda: bump_version(RECIPES_VERSION))
+    return True
+
+
+image_executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_VARIANT_THREADS,
+    thread_name_prefix="foodgram-images",
+)
+
+
+def build_in_background(recipe_id):
+    try:
+        recipe = Recipe.objects.only("id", "image", "image_variants").filter(
+            pk=recipe_id
+        ).first()
+        if recipe is not None:
+            refresh_image_variants(recipe)
+    finally:
+        close_old_connections()
+
+
+def schedule_image_variants(recipe):
+    """После фиксации транзакции строит варианты в фоновом потоке.
+
+    Уменьшение изображения не задерживает ответ на запрос. Если процесс
+    завершится раньше, варианты достроит команда ``build_recipe_images``.
+    """
+    if needs_image_variants(recipe):
+        recipe_id = recipe.pk
+        transaction.on_commit(
+            lambda: image_executor.submit(build_in_background, recipe_id)
+        )
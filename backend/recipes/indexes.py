@@ -0,0 +1,262 @@
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from types import MappingProxyType
+
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+
+from .cache import (INGREDIENTS_VERSION, RECIPES_VERSION, TAGS_VERSION,
+                    USERS_VERSION, get_version)
+from .models import Ingredients, Recipe, Tags
+
+WORD = re.compile(r"\w+")
+RUSSIAN_ENDINGS = sorted(
+    (
+        "ами", "ями", "ого", "его", "ому", "ему", "ыми", "ими", "ой", "ей",
+        "ий", "ый", "ая", "яя", "ое", "ее", "ые", "ие", "ов", "ев", "ам",
+        "ям", "ах", "ях", "ом", "ем", "ую", "юю", "а", "я", "о", "е", "ы",
+        "и", "у", "ю", "ь",
+    ),
+    key=len,
+    reverse=True,
+)
+NAME_WEIGHT = 2
+TEXT_WEIGHT = 1
+
+User = get_user_model()
+
+
+class IngredientPrefixIndex:
+    """Индекс ингредиентов по префиксу названия для автодополнения.
+
+    Хранит строки таблицы в порядке ``Ingredients.Meta.ordering`` и
+    отсортированный массив названий в нижнем регистре. Перестраивается,
+    когда меняется версия ``INGREDIENTS_VERSION``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+
+    def _build(self, version):
+        # Индекс живёт до следующей смены версии, поэтому строится по
+        # основной БД, а не по возможно отстающей реплике.
+        rows = list(
+            Ingredients.objects.using(DEFAULT_DB_ALIAS).values(
+                "id", "name", "measurement_unit"
+            )
+        )
+        entries = sorted(
+            (row["name"].lower(), position)
+            for position, row in enumerate(rows)
+        )
+        keys = [key for key, _ in entries]
+        positions = [position for _, position in entries]
+        return version, keys, positions, rows
+
+    def _get_state(self):
+        version = get_version(INGREDIENTS_VERSION)
+        state = self._state
+        if state is None or state[0] != version:
+            with self._lock:
+                state = self._state
+                if state is None or state[0] != version:
+                    state = self._build(version)
+                    self._state = state
+        return state
+
+    def search(self, prefix):
+        _, keys, positions, rows = self._get_state()
+        if not prefix:
+            return rows
+        prefix = prefix.lower()
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + "\U0010ffff", lo=start)
+        return [rows[position] for position in sorted(positions[start:end])]
+
+
+class TagSnapshot:
+    """Неизменяемый снимок таблицы тэгов в памяти процесса.
+
+    Тэги меняются редко, поэтому список, фильтр и проверка тэгов рецепта
+    обходятся без запросов к БД. Снимок пересобирается, когда меняется
+    общая для всех воркеров версия ``TAGS_VERSION``.
+    """
+
+    fields = ("id", "name", "color", "slug")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+
+    def _build(self, version):
+        names = [field.attname for field in Tags._meta.concrete_fields]
+        records = tuple(
+            Tags.objects.using(DEFAULT_DB_ALIAS).values_list(*names)
+        )
+        rows = tuple(
+            MappingProxyType({
+                name: value
+                for name, value in zip(names, record)
+                if name in self.fields
+            })
+            for record in records
+        )
+        return (
+            version,
+            rows,
+            MappingProxyType({row["id"]: row for row in rows}),
+            MappingProxyType({row["slug"]: row["id"] for row in rows}),
+            MappingProxyType({record[0]: record for record in records}),
+            names,
+        )
+
+    def _get_state(self):
+        version = get_version(TAGS_VERSION)
+        state = self._state
+        if state is None or state[0] != version:
+            with self._lock:
+                state = self._state
+                if state is None or state[0] != version:
+                    state = self._build(version)
+                    self._state = state
+        return state
+
+    def __deepcopy__(self, memo):
+        # Поля сериализаторов копируются глубоко, снимок должен остаться общим.
+        return self
+
+    @property
+    def version(self):
+        return self._get_state()[0]
+
+    def rows(self):
+        """Тэги в порядке ``Tags.Meta.ordering`` в виде словарей."""
+        return [dict(row) for row in self._get_state()[1]]
+
+    def rows_for(self, ids):
+        """Тэги с указанными id в порядке ``Tags.Meta.ordering``."""
+        ids = set(ids)
+        return [dict(row) for row in self._get_state()[1] if row["id"] in ids]
+
+    def get(self, pk):
+        row = self._get_state()[2].get(pk)
+        return None if row is None else dict(row)
+
+    def ids_by_slug(self):
+        return self._get_state()[3]
+
+    def in_bulk(self, ids):
+        """Как ``QuerySet.in_bulk``: ``{id: Tags}`` для найденных id."""
+        _, _, _, _, records, names = self._get_state()
+        return {
+            pk: Tags.from_db(DEFAULT_DB_ALIAS, names, records[pk])
+            for pk in ids
+            if pk in records
+        }
+
+
+def stem(word):
+    """Упрощённый стеммер: отбрасывает типичное окончание слова."""
+    for ending in RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= 3:
+            return word[:-len(ending)]
+    return word
+
+
+def tokenize(text):
+    return [stem(word) for word in WORD.findall(text.lower())]
+
+
+class RecipeSearchIndex:
+    """Инвертированный индекс рецептов для баз без полнотекстового поиска.
+
+    Используется вместо ``search_vector`` на SQLite (например, в тестах) и
+    перестраивается при смене версии ``RECIPES_VERSION``.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+
+    def _build(self, version):
+        postings = defaultdict(dict)
+        recipes = Recipe.objects.using(DEFAULT_DB_ALIAS).values_list(
+            "id", "name", "text"
+        )
+        for pk, name, text in recipes.iterator():
+            weights = Counter()
+            for token in tokenize(name):
+                weights[token] += NAME_WEIGHT
+            for token in tokenize(text):
+                weights[token] += TEXT_WEIGHT
+            for token, weight in weights.items():
+                postings[token][pk] = weight
+        return version, dict(postings)
+
+    def _get_state(self):
+        version = get_version(RECIPES_VERSION)
+        state = self._state
+        if state is None or state[0] != version:
+            with self._lock:
+                state = self._state
+                if state is None or state[0] != version:
+                    state = self._build(version)
+                    self._state = state
+        return state
+
+    def search(self, query):
+        """Возвращает ``{id: релевантность}`` рецептов со всеми словами."""
+        _, postings = self._get_state()
+        tokens = set(tokenize(query))
+        if not tokens:
+            return {}
+        matches = [postings.get(token, {}) for token in tokens]
+        found = set.intersection(*(set(match) for match in matches))
+        return {
+            pk: float(sum(match[pk] for match in matches)) for pk in found
+        }
+
+
+class AuthorIndex:
+    """Множество id авторов рецептов для проверки фильтра ``?author=``.
+
+    Пересобирается при смене версии ``USERS_VERSION``. Id, которого нет
+    в множестве, проверяется запросом к БД: это может быть пользователь
+    без рецептов или автор первого рецепта, ещё не попавший в снимок.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+
+    def _build(self, version):
+        return version, frozenset(
+            Recipe.objects.using(DEFAULT_DB_ALIAS).values_list(
+                "author_id", flat=True
+            ).distinct()
+        )
+
+    def _get_state(self):
+        version = get_version(USERS_VERSION)
+        state = self._state
+        if state is None or state[0] != version:
+            with self._lock:
+                state = self._state
+                if state is None or state[0] != version:
+                    state = self._build(version)
+                    self._state = state
+        return state
+
+    def __contains__(self, pk):
+        if pk in self._get_state()[1]:
+            return True
+        return User.objects.filter(pk=pk).exists()
+
+
+author_index = AuthorIndex()
+ingredient_index = IngredientPrefixIndex()
+recipe_search_index = RecipeSearchIndex()
+tag_snapshot = TagSnapshot()
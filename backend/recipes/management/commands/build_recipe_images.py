@@ -0,0 +1,19 @@
+from django.core.management import BaseCommand
+
+from recipes.images import refresh_image_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = "build resized WebP and JPEG variants of recipe images"
+
+    def handle(self, *args, **kwargs):
+        built = 0
+        for recipe in Recipe.objects.only(
+            "id", "image", "image_variants"
+        ).iterator():
+            if refresh_image_variants(recipe):
+                built += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Обновлены изображения рецептов: {built}"
+        ))
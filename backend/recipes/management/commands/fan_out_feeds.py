@@ -0,0 +1,16 @@
+from django.core.management import BaseCommand
+
+from recipes.feed import fan_out_pulled_authors
+
+
+class Command(BaseCommand):
+    help = (
+        "fan out recipes of authors who dropped below "
+        "FEED_FANOUT_FOLLOWERS_LIMIT followers"
+    )
+
+    def handle(self, *args, **kwargs):
+        authors = fan_out_pulled_authors()
+        self.stdout.write(self.style.SUCCESS(
+            f"Рецепты разосланы по лентам, авторов: {authors}"
+        ))
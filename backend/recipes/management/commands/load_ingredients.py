@@ -1,24 +1,153 @@
 import csv
+import json
+import os
+import re
+import time
+from itertools import islice
+
 from django.conf import settings
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
 
+from recipes.cache import INGREDIENTS_VERSION, bump_version
 from recipes.models import Ingredients
 
+READ_SIZE = 64 * 1024
+JSON_SEPARATOR = re.compile(r"[\s,]*")
+
+
+def read_csv(path):
+    with open(path, encoding="utf-8", newline="") as file:
+        reader = csv.DictReader(file, fieldnames=[
+            "name", "measurement_unit"
+        ])
+        for row in reader:
+            yield row["name"], row["measurement_unit"]
+
+
+def read_json(path):
+    """Построчно читает массив ингредиентов, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as file:
+        buffer = file.read(READ_SIZE).lstrip()
+        if not buffer.startswith("["):
+            raise CommandError("JSON-файл должен содержать массив")
+        position = 1
+        while True:
+            position = JSON_SEPARATOR.match(buffer, position).end()
+            if buffer.startswith("]", position):
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                chunk = file.read(READ_SIZE)
+                if not chunk:
+                    raise CommandError("Некорректный JSON-файл")
+                buffer = buffer[position:] + chunk
+                position = 0
+                continue
+            yield item["name"], item["measurement_unit"]
+
+
+READERS = {
+    "csv": read_csv,
+    "json": read_json,
+}
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    chunk = list(islice(rows, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(rows, size))
+
 
 class Command(BaseCommand):
     help = "import ingredients"
 
-    def handle(self, *args, **kwargs):
-        with open(
-            f"{settings.DIR_DATA_CSV}/ingredients.csv",
-            encoding="utf-8"
-        ) as file:
-            reader = csv.DictReader(file, fieldnames=[
-                "name", "measurement_unit"
-            ])
-            for row in reader:
-                Ingredients.objects.update_or_create(**row)
-
-        self.stdout.write(self.style.SUCCESS(
-            "Ингредиенты загружены в БД"
-        ))        
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path",
+            nargs="?",
+            default=os.path.join(settings.DIR_DATA_CSV, "ingredients.csv"),
+            help="Путь к файлу ingredients.csv или ingredients.json",
+        )
+        parser.add_argument(
+            "--format",
+            choices=sorted(READERS),
+            help="Формат файла (по умолчанию определяется по расширению)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Количество строк в одной пачке",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Показать новые ингредиенты, ничего не записывая",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = (
+            options["format"] or os.path.splitext(path)[1].lstrip(".")
+        ).lower()
+        if file_format not in READERS:
+            raise CommandError(f"Неизвестный формат файла: {path}")
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size должен быть больше нуля")
+        dry_run = options["dry_run"]
+
+        started = time.monotonic()
+        total = created = 0
+        seen = set()
+        for chunk in chunked(READERS[file_format](path),
+                             options["batch_size"]):
+            total += len(chunk)
+            new = self.new_rows(chunk, seen)
+            created += len(new)
+            if dry_run:
+                for name, measurement_unit in new:
+                    self.stdout.write(f"+ {name} ({measurement_unit})")
+                continue
+            Ingredients.objects.bulk_create(
+                [
+                    Ingredients(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in new
+                ],
+                ignore_conflicts=True,
+            )
+        elapsed = time.monotonic() - started
+
+        if created and not dry_run:
+            bump_version(INGREDIENTS_VERSION)
+        rate = total / elapsed if elapsed else total
+        self.stdout.write(
+            f"Строк: {total}, новых: {created}, "
+            f"уже в БД: {total - created}, "
+            f"{elapsed:.2f} с ({rate:.0f} строк/с)"
+        )
+        if dry_run:
+            self.stdout.write("Пробный запуск: БД не изменена")
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                "Ингредиенты загружены в БД"
+            ))
+
+    def new_rows(self, chunk, seen):
+        """Строки пачки, которых нет ни в БД, ни в предыдущих пачках.
+
+        Повторы между пачками отсекаются по ``seen``: при пробном запуске
+        предыдущие пачки не записаны в БД, и без этого дубликат из разных
+        пачек посчитался бы новым дважды.
+        """
+        rows = [row for row in dict.fromkeys(chunk) if row not in seen]
+        seen.update(rows)
+        existing = set(
+            Ingredients.objects.filter(
+                name__in={name for name, _ in rows}
+            ).values_list("name", "measurement_unit")
+        )
+        return [row for row in rows if row not in existing]
@@ -0,0 +1,21 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from recipes.counters import recount_all
+from recipes.shopping import rebuild_totals
+
+
+class Command(BaseCommand):
+    help = (
+        "recount denormalized favourite, cart and recipe counters "
+        "and shopping list totals"
+    )
+
+    def handle(self, *args, **kwargs):
+        with transaction.atomic():
+            fixed = recount_all()
+            totals = rebuild_totals()
+        for counter, rows in fixed.items():
+            self.stdout.write(f"{counter}: исправлено строк {rows}")
+        self.stdout.write(f"Итоги списков покупок: строк {totals}")
+        self.stdout.write(self.style.SUCCESS("Счётчики пересчитаны"))
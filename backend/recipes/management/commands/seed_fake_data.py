@@ -0,0 +1,208 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from recipes.cache import (INGREDIENTS_VERSION, RECIPES_VERSION, TAGS_VERSION,
+                           bump_version)
+from recipes.counters import recount_all
+from recipes.feed import rebuild_feed
+from recipes.models import (Favourite, IngredientInRecipe, Ingredients, Recipe,
+                            ShoppingCart, Tags)
+from recipes.search import update_search_vector
+from recipes.shopping import rebuild_totals
+from users.models import Follow
+
+User = get_user_model()
+
+BATCH_SIZE = 2000
+WORDS = (
+    "суп", "салат", "пирог", "рагу", "каша", "омлет", "паста", "плов",
+    "запеканка", "блины", "сырники", "котлеты", "борщ", "жаркое", "десерт",
+)
+ADJECTIVES = (
+    "домашний", "быстрый", "летний", "острый", "сытный", "лёгкий",
+    "праздничный", "бабушкин", "весенний", "постный",
+)
+
+
+def random_pairs(rng, left, right, amount):
+    """Возвращает до ``amount`` уникальных пар из двух списков."""
+    amount = min(amount, len(left) * len(right))
+    pairs = set()
+    while len(pairs) < amount:
+        pairs.add((rng.choice(left), rng.choice(right)))
+    return sorted(pairs)
+
+
+class Command(BaseCommand):
+    help = "generate deterministic fake users, recipes and relations"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--recipes", type=int, default=1000)
+        parser.add_argument("--tags", type=int, default=10)
+        parser.add_argument("--ingredients-per-recipe", type=int, default=8)
+        parser.add_argument("--favorites", type=int, default=5000)
+        parser.add_argument("--carts", type=int, default=2000)
+        parser.add_argument("--follows", type=int, default=2000)
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        prefix = f"fake{options['seed']}_"
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(
+                f"Данные с seed={options['seed']} уже созданы"
+            )
+        ingredient_ids = list(
+            Ingredients.objects.order_by("id").values_list("id", flat=True)
+        )
+        if len(ingredient_ids) < options["ingredients_per_recipe"]:
+            raise CommandError(
+                "Недостаточно ингредиентов, выполните load_ingredients"
+            )
+
+        tag_ids = self.create_tags(rng, options["tags"])
+        user_ids = self.create_users(prefix, options["users"])
+        recipe_ids = self.create_recipes(
+            rng, user_ids, options["recipes"]
+        )
+        self.link_recipes(
+            rng,
+            recipe_ids,
+            tag_ids,
+            ingredient_ids,
+            options["ingredients_per_recipe"],
+        )
+        Favourite.objects.bulk_create(
+            [
+                Favourite(user_id=user_id, recipe_id=recipe_id)
+                for user_id, recipe_id in random_pairs(
+                    rng, user_ids, recipe_ids, options["favorites"]
+                )
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        ShoppingCart.objects.bulk_create(
+            [
+                ShoppingCart(user_id=user_id, recipe_id=recipe_id)
+                for user_id, recipe_id in random_pairs(
+                    rng, user_ids, recipe_ids, options["carts"]
+                )
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        Follow.objects.bulk_create(
+            [
+                Follow(user_id=user_id, author_id=author_id)
+                for user_id, author_id in random_pairs(
+                    rng, user_ids, user_ids, options["follows"]
+                )
+                if user_id != author_id
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        update_search_vector(Recipe.objects.filter(pk__in=recipe_ids))
+        recount_all()
+        rebuild_totals()
+        rebuild_feed()
+        for name in (RECIPES_VERSION, TAGS_VERSION, INGREDIENTS_VERSION):
+            transaction.on_commit(lambda name=name: bump_version(name))
+        self.stdout.write(self.style.SUCCESS(
+            f"Создано: пользователей {len(user_ids)}, "
+            f"рецептов {len(recipe_ids)}, тэгов {len(tag_ids)}"
+        ))
+
+    def create_tags(self, rng, amount):
+        existing = Tags.objects.count()
+        Tags.objects.bulk_create(
+            [
+                Tags(
+                    name=f"Тэг {number}",
+                    slug=f"tag-{number}",
+                    color="#{:06X}".format(rng.randrange(0x1000000)),
+                )
+                for number in range(existing, amount)
+            ],
+            ignore_conflicts=True,
+        )
+        return list(Tags.objects.order_by("id").values_list("id", flat=True))
+
+    def create_users(self, prefix, amount):
+        password = make_password("password")
+        User.objects.bulk_create(
+            [
+                User(
+                    username=f"{prefix}{number}",
+                    email=f"{prefix}{number}@example.com",
+                    first_name=f"Имя{number}",
+                    last_name=f"Фамилия{number}",
+                    password=password,
+                )
+                for number in range(amount)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        return list(
+            User.objects.filter(
+                username__startswith=prefix
+            ).order_by("id").values_list("id", flat=True)
+        )
+
+    def create_recipes(self, rng, user_ids, amount):
+        Recipe.objects.bulk_create(
+            [
+                Recipe(
+                    author_id=rng.choice(user_ids),
+                    name=(
+                        f"{rng.choice(ADJECTIVES).capitalize()} "
+                        f"{rng.choice(WORDS)} №{number}"
+                    ),
+                    text=" ".join(rng.choices(WORDS + ADJECTIVES, k=30)),
+                    cooking_time=rng.randint(5, 240),
+                )
+                for number in range(amount)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        recipes = list(
+            Recipe.objects.filter(author_id__in=user_ids).order_by("id")
+        )
+        now = timezone.now()
+        for recipe in recipes:
+            recipe.pub_date = now - timedelta(
+                minutes=rng.randint(0, 60 * 24 * 365)
+            )
+        Recipe.objects.bulk_update(
+            recipes, ["pub_date"], batch_size=BATCH_SIZE
+        )
+        return [recipe.id for recipe in recipes]
+
+    def link_recipes(self, rng, recipe_ids, tag_ids, ingredient_ids,
+                     ingredients_per_recipe):
+        tag_link = Recipe.tags.through
+        tag_links = []
+        ingredient_links = []
+        for recipe_id in recipe_ids:
+            for tag_id in rng.sample(tag_ids, min(len(tag_ids), 2)):
+                tag_links.append(
+                    tag_link(recipe_id=recipe_id, tags_id=tag_id)
+                )
+            for ingredient_id in rng.sample(
+                ingredient_ids, ingredients_per_recipe
+            ):
+                ingredient_links.append(IngredientInRecipe(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=rng.randint(1, 500),
+                ))
+        tag_link.objects.bulk_create(tag_links, batch_size=BATCH_SIZE)
+        IngredientInRecipe.objects.bulk_create(
+            ingredient_links, batch_size=BATCH_SIZE
+        )
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.18 on 2026-10-18 03:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_pull_authors(apps, schema_editor):
+    User = apps.get_model("users", "User")
+    FeedPullAuthor = apps.get_model("recipes", "FeedPullAuthor")
+    FeedPullAuthor.objects.bulk_create(
+        FeedPullAuthor(author_id=pk)
+        for pk in User.objects.filter(
+            followers_count__gte=settings.FEED_FANOUT_FOLLOWERS_LIMIT
+        ).values_list("pk", flat=True).iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_user_followers_count'),
+        ('recipes', '0010_recipedocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedPullAuthor',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='users.user', verbose_name='Автор')),
+            ],
+            options={
+                'verbose_name': 'Автор без рассылки',
+                'verbose_name_plural': 'Авторы без рассылки',
+            },
+        ),
+        migrations.RunPython(fill_pull_authors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.18 on 2026-10-18 03:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_feedpullauthor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipedocument',
+            name='stamp',
+            field=models.CharField(default='', max_length=200, verbose_name='Метка данных'),
+        ),
+    ]
@@ -1,7 +1,10 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
 
+from .counters import CountersMixin
+
 User = get_user_model()
 
 
@@ -24,6 +27,11 @@ class Tags(models.Model):
         verbose_name="Слаг тэга"
     )
 
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Дата изменения"
+    )
+
     class Meta:
         ordering = ("name", )
         verbose_name = "Тэг"
@@ -43,6 +51,11 @@ class Ingredients(models.Model):
         verbose_name="Единица измерения"
     )
 
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Дата изменения"
+    )
+
     class Meta:
         ordering = ("id", )
         verbose_name = "Ингредиент"
@@ -58,7 +71,7 @@ class Ingredients(models.Model):
         return f"{self.name}"
 
 
-class Recipe(models.Model):
+class Recipe(CountersMixin, models.Model):
     ingredients = models.ManyToManyField(
         Ingredients,
         through="IngredientInRecipe",
@@ -77,6 +90,12 @@ class Recipe(models.Model):
         blank=True,
         null=True
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name="Уменьшенные копии изображения"
+    )
     name = models.CharField(
         max_length=200,
         verbose_name="Название"
@@ -103,11 +122,47 @@ class Recipe(models.Model):
         verbose_name="Автор",
         related_name="recipes"
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Добавлений в избранное"
+    )
+    shopping_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Добавлений в корзину"
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name="Поисковый вектор"
+    )
+
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Дата изменения"
+    )
+
+    counter_fields = ("favorites_count", "shopping_carts_count")
 
     class Meta:
-        ordering = ("-pub_date", )
+        ordering = ("-pub_date", "-id")
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
+        indexes = [
+            models.Index(
+                fields=["-pub_date", "-id"],
+                name="recipe_pub_date_id_idx",
+            ),
+            models.Index(
+                fields=["author", "-pub_date", "-id"],
+                name="recipe_author_pub_date_idx",
+            ),
+            models.Index(
+                fields=["-favorites_count", "-pub_date"],
+                name="recipe_popular_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.name}"
@@ -204,3 +259,134 @@ class ShoppingCart(models.Model):
 
     def __str__(self):
         return f"{self.user} добавил в корзину: {self.recipe}"
+
+
+class ShoppingCartTotal(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="shopping_totals",
+        verbose_name="Пользователь"
+    )
+    ingredient = models.ForeignKey(
+        Ingredients,
+        on_delete=models.CASCADE,
+        related_name="shopping_totals",
+        verbose_name="Ингредиент"
+    )
+    amount = models.PositiveIntegerField(
+        verbose_name="Количество"
+    )
+
+    class Meta:
+        verbose_name = "Итог по ингредиенту"
+        verbose_name_plural = "Итоги списков покупок"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "ingredient"],
+                name="unique_ingredient_total_for_user",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user}: {self.ingredient} {self.amount}"
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписок пользователя (рассылка при публикации)."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="feed_entries",
+        verbose_name="Подписчик"
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name="feed_entries",
+        verbose_name="Рецепт"
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="Автор"
+    )
+    pub_date = models.DateTimeField(
+        verbose_name="Дата публикации"
+    )
+
+    class Meta:
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Ленты подписок"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "recipe"],
+                name="unique_feed_recipe_for_user",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "-pub_date", "-recipe"],
+                name="feed_user_pub_date_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user}: {self.recipe}"
+
+
+class FeedPullAuthor(models.Model):
+    """Автор, рецепты которого подмешиваются в ленты при чтении.
+
+    Отметка ставится, когда у автора становится
+    ``FEED_FANOUT_FOLLOWERS_LIMIT`` подписчиков, и снимается командой
+    ``fan_out_feeds`` после рассылки его рецептов по лентам.
+    """
+
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="+",
+        verbose_name="Автор"
+    )
+
+    class Meta:
+        verbose_name = "Автор без рассылки"
+        verbose_name_plural = "Авторы без рассылки"
+
+    def __str__(self):
+        return f"{self.author_id}"
+
+
+class RecipeDocument(models.Model):
+    """Готовое представление рецепта без флагов пользователя.
+
+    Хранится текстом, а не ``JSONField``: jsonb в PostgreSQL не сохраняет
+    порядок ключей, а ответ должен совпадать с сериализатором.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="document",
+        verbose_name="Рецепт"
+    )
+    data = models.TextField(
+        verbose_name="Документ"
+    )
+    stamp = models.CharField(
+        max_length=200,
+        default="",
+        verbose_name="Метка данных"
+    )
+
+    class Meta:
+        verbose_name = "Документ рецепта"
+        verbose_name_plural = "Документы рецептов"
+
+    def __str__(self):
+        return f"{self.recipe_id}"
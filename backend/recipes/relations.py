@@ -0,0 +1,82 @@
+from django.db import connection, transaction
+
+from .cache import bump_version, user_version
+from .counters import increment
+from .models import Favourite, Recipe, ShoppingCart
+from .shopping import cart_changed
+
+COUNTERS = {
+    Favourite: "favorites_count",
+    ShoppingCart: "shopping_carts_count",
+}
+
+
+def relations_changed(model, user_id, recipe_ids, delta=1):
+    """Обновляет всё, что зависит от избранного или корзины пользователя.
+
+    Общий обработчик для сигналов ``Favourite`` и ``ShoppingCart`` и для
+    ``add_recipes``/``remove_recipes``, которые сигналов не отправляют:
+    счётчики рецептов, итоги корзины и версия данных пользователя.
+    """
+    if not recipe_ids:
+        return
+    increment(Recipe.objects.filter(pk__in=recipe_ids), COUNTERS[model], delta)
+    transaction.on_commit(lambda: bump_version(user_version(user_id)))
+    if model is ShoppingCart:
+        cart_changed(user_id, recipe_ids, delta)
+
+
+def columns(model):
+    meta = model._meta
+    return (
+        connection.ops.quote_name(meta.db_table),
+        connection.ops.quote_name(meta.get_field("user").column),
+        connection.ops.quote_name(meta.get_field("recipe").column),
+    )
+
+
+@transaction.atomic
+def add_recipes(model, user, recipe_ids):
+    """Добавляет рецепты в избранное или корзину одним запросом.
+
+    Уже добавленные рецепты пропускаются; возвращает id вставленных.
+    """
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    if not recipe_ids:
+        return []
+    table, user_column, recipe_column = columns(model)
+    values = ", ".join(["(%s, %s)"] * len(recipe_ids))
+    params = [value for pk in recipe_ids for value in (user.pk, pk)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({user_column}, {recipe_column}) "
+            f"VALUES {values} ON CONFLICT DO NOTHING "
+            f"RETURNING {recipe_column}",
+            params,
+        )
+        added = [row[0] for row in cursor.fetchall()]
+    relations_changed(model, user.pk, added)
+    return added
+
+
+@transaction.atomic
+def remove_recipes(model, user, recipe_ids):
+    """Удаляет рецепты из избранного или корзины одним запросом.
+
+    Возвращает id рецептов, которые действительно были удалены.
+    """
+    recipe_ids = list(dict.fromkeys(recipe_ids))
+    if not recipe_ids:
+        return []
+    table, user_column, recipe_column = columns(model)
+    placeholders = ", ".join(["%s"] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {table} WHERE {user_column} = %s "
+            f"AND {recipe_column} IN ({placeholders}) "
+            f"RETURNING {recipe_column}",
+            [user.pk, *recipe_ids],
+        )
+        removed = [row[0] for row in cursor.fetchall()]
+    relations_changed(model, user.pk, removed, -1)
+    return removed
@@ -0,0 +1,56 @@
+from collections import defaultdict
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import Case, F, FloatField, Value, When
+
+SEARCH_CONFIG = "russian"
+
+
+def search_vector():
+    return (
+        SearchVector("name", weight="A", config=SEARCH_CONFIG)
+        + SearchVector("text", weight="B", config=SEARCH_CONFIG)
+    )
+
+
+def uses_postgres():
+    return connection.vendor == "postgresql"
+
+
+def update_search_vector(queryset):
+    """Пересчитывает ``Recipe.search_vector`` для строк ``queryset``."""
+    if uses_postgres():
+        queryset.update(search_vector=search_vector())
+
+
+def search_recipes(queryset, value):
+    """Фильтрует рецепты по запросу и сортирует их по релевантности."""
+    if uses_postgres():
+        query = SearchQuery(
+            value, config=SEARCH_CONFIG, search_type="websearch"
+        )
+        return queryset.filter(search_vector=query).annotate(
+            rank=SearchRank(F("search_vector"), query)
+        ).order_by("-rank", "-pub_date", "-id")
+
+    from .indexes import recipe_search_index
+
+    # Релевантность — сумма небольших целых весов, поэтому различных
+    # значений мало: одно условие на значение, а не на каждый рецепт.
+    ids_by_rank = defaultdict(list)
+    for pk, rank in recipe_search_index.search(value).items():
+        ids_by_rank[rank].append(pk)
+    return queryset.filter(
+        pk__in=[pk for ids in ids_by_rank.values() for pk in ids]
+    ).annotate(
+        rank=Case(
+            *[
+                When(pk__in=ids, then=Value(rank))
+                for rank, ids in ids_by_rank.items()
+            ],
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+    ).order_by("-rank", "-pub_date", "-id")
@@ -0,0 +1,98 @@
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import IngredientInRecipe, ShoppingCart, ShoppingCartTotal
+
+User = get_user_model()
+
+
+@transaction.atomic
+def apply_deltas(deltas):
+    """Изменяет итоги списков покупок на ``{(user_id, ingredient_id): delta}``.
+
+    Строки пользователей блокируются, чтобы параллельные изменения
+    одной корзины не создавали дубликаты итогов.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    user_ids = {user_id for user_id, _ in deltas}
+    list(
+        User.objects.select_for_update().filter(
+            pk__in=user_ids
+        ).order_by("pk").values_list("pk", flat=True)
+    )
+    existing = {
+        (total.user_id, total.ingredient_id): total
+        for total in ShoppingCartTotal.objects.filter(
+            user_id__in=user_ids,
+            ingredient_id__in={ingredient_id for _, ingredient_id in deltas}
+        )
+    }
+    changed, removed, added = [], [], []
+    for (user_id, ingredient_id), delta in deltas.items():
+        total = existing.get((user_id, ingredient_id))
+        if total is None:
+            if delta > 0:
+                added.append(ShoppingCartTotal(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    amount=delta
+                ))
+            continue
+        total.amount += delta
+        if total.amount > 0:
+            changed.append(total)
+        else:
+            removed.append(total.pk)
+    ShoppingCartTotal.objects.bulk_update(changed, ["amount"])
+    ShoppingCartTotal.objects.filter(pk__in=removed).delete()
+    ShoppingCartTotal.objects.bulk_create(added)
+
+
+def cart_changed(user_id, recipe_ids, sign=1):
+    """Учитывает добавление (``sign=1``) или удаление рецептов корзины."""
+    deltas = Counter()
+    for ingredient_id, amount in IngredientInRecipe.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list("ingredient_id", "amount"):
+        deltas[(user_id, ingredient_id)] += sign * amount
+    apply_deltas(deltas)
+
+
+def recipe_ingredients_changed(recipe_id, ingredient_deltas):
+    """Учитывает изменение количеств ингредиентов рецепта в корзинах."""
+    user_ids = ShoppingCart.objects.filter(
+        recipe_id=recipe_id
+    ).values_list("user_id", flat=True)
+    apply_deltas({
+        (user_id, ingredient_id): delta
+        for user_id in user_ids
+        for ingredient_id, delta in ingredient_deltas.items()
+    })
+
+
+def rebuild_totals():
+    """Полностью пересчитывает итоги из корзин; возвращает число строк."""
+    rows = IngredientInRecipe.objects.filter(
+        recipe__shopping_cart_recipe__isnull=False
+    ).values(
+        "recipe__shopping_cart_recipe__user", "ingredient"
+    ).annotate(total=Sum("amount")).order_by()
+    with transaction.atomic():
+        ShoppingCartTotal.objects.all().delete()
+        ShoppingCartTotal.objects.bulk_create(
+            [
+                ShoppingCartTotal(
+                    user_id=row["recipe__shopping_cart_recipe__user"],
+                    ingredient_id=row["ingredient"],
+                    amount=row["total"],
+                )
+                for row in rows.iterator()
+            ],
+            batch_size=1000,
+        )
+    return ShoppingCartTotal.objects.count()
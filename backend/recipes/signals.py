@@ -0,0 +1,193 @@
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+from users.models import Follow
+
+from .cache import (INGREDIENTS_VERSION, RECIPES_VERSION, TAGS_VERSION,
+                    USERS_VERSION, bump_version, user_version)
+from .counters import increment
+from .feed import fan_out, follow_created, follow_deleted
+from .images import delete_image_variants, schedule_image_variants
+from .models import (Favourite, IngredientInRecipe, Ingredients, Recipe,
+                     ShoppingCart, Tags)
+from .relations import relations_changed
+from .search import update_search_vector
+from .shopping import recipe_ingredients_changed
+
+User = get_user_model()
+
+# Поля автора, которые входят в рецепты и их документы.
+AUTHOR_FIELDS = ("email", "username", "first_name", "last_name")
+
+
+def bump_on_commit(name):
+    transaction.on_commit(lambda: bump_version(name))
+
+
+@receiver(post_save, sender=Ingredients)
+@receiver(post_delete, sender=Ingredients)
+def ingredients_changed(sender, **kwargs):
+    bump_on_commit(INGREDIENTS_VERSION)
+
+
+@receiver(post_save, sender=Tags)
+@receiver(post_delete, sender=Tags)
+def tags_changed(sender, **kwargs):
+    bump_on_commit(TAGS_VERSION)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=IngredientInRecipe)
+@receiver(post_delete, sender=IngredientInRecipe)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipes_changed(sender, **kwargs):
+    bump_on_commit(RECIPES_VERSION)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        schedule_image_variants(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_text_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {"name", "text"} & set(update_fields):
+        update_search_vector(Recipe.objects.filter(pk=instance.pk))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_image_deleted(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: delete_image_variants(instance.image_variants or {})
+    )
+
+
+@receiver(pre_save, sender=User)
+def author_saving(sender, instance, raw=False, update_fields=None,
+                  **kwargs):
+    instance._saved_author = None
+    if instance._state.adding or raw:
+        return
+    if update_fields is None or set(AUTHOR_FIELDS) & set(update_fields):
+        instance._saved_author = User.objects.filter(
+            pk=instance.pk
+        ).values_list(*AUTHOR_FIELDS).first()
+
+
+def author_fields_changed(user):
+    """Изменились ли при сохранении поля автора, входящие в рецепты.
+
+    Новый пользователь, пароль или ``last_login`` рецептов не меняют.
+    """
+    saved = getattr(user, "_saved_author", None)
+    return saved is not None and saved != tuple(
+        getattr(user, name) for name in AUTHOR_FIELDS
+    )
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, **kwargs):
+    if author_fields_changed(instance):
+        bump_on_commit(RECIPES_VERSION)
+        bump_on_commit(USERS_VERSION)
+
+
+@receiver(post_delete, sender=User)
+def author_deleted(sender, **kwargs):
+    # Удалённый автор не должен проходить проверку фильтра ``?author=``.
+    bump_on_commit(USERS_VERSION)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def user_relations_changed(sender, instance, **kwargs):
+    bump_on_commit(user_version(instance.user_id))
+
+
+@receiver(post_save, sender=Favourite)
+@receiver(post_save, sender=ShoppingCart)
+def relation_created(sender, instance, created, **kwargs):
+    if created:
+        relations_changed(sender, instance.user_id, [instance.recipe_id])
+
+
+@receiver(post_delete, sender=Favourite)
+@receiver(post_delete, sender=ShoppingCart)
+def relation_deleted(sender, instance, **kwargs):
+    relations_changed(sender, instance.user_id, [instance.recipe_id], -1)
+
+
+@receiver(pre_save, sender=IngredientInRecipe)
+def recipe_ingredient_saving(sender, instance, raw=False, **kwargs):
+    instance._saved_row = None
+    if instance.pk and not raw:
+        instance._saved_row = IngredientInRecipe.objects.filter(
+            pk=instance.pk
+        ).values_list("ingredient_id", "amount").first()
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+def recipe_ingredient_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    deltas = Counter({instance.ingredient_id: instance.amount})
+    if instance._saved_row is not None:
+        ingredient_id, amount = instance._saved_row
+        deltas[ingredient_id] -= amount
+    recipe_ingredients_changed(instance.recipe_id, deltas)
+
+
+@receiver(post_delete, sender=IngredientInRecipe)
+def recipe_ingredient_deleted(sender, instance, **kwargs):
+    recipe_ingredients_changed(
+        instance.recipe_id, {instance.ingredient_id: -instance.amount}
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        increment(User.objects.filter(pk=instance.author_id), "recipes_count")
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    increment(
+        User.objects.filter(pk=instance.author_id), "recipes_count", -1
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    if not created:
+        return
+    increment(User.objects.filter(pk=instance.author_id), "followers_count")
+    if not raw:
+        follow_created(
+            instance.user_id,
+            User.objects.only("followers_count").get(pk=instance.author_id)
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def follow_removed(sender, instance, **kwargs):
+    increment(
+        User.objects.filter(pk=instance.author_id), "followers_count", -1
+    )
+    author = User.objects.only("followers_count").filter(
+        pk=instance.author_id
+    ).first()
+    if author is not None:
+        follow_deleted(instance.user_id, author)
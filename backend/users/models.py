@@ -1,8 +1,9 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from recipes.counters import CountersMixin
 
 
-class User(AbstractUser):
+class User(CountersMixin, AbstractUser):
     first_name = models.CharField(
         max_length=150,
         verbose_name="Имя",
@@ -24,10 +25,22 @@ class User(AbstractUser):
         verbose_name="Электронная почта",
         help_text="Введите электронную почту"
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Количество рецептов"
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="Количество подписчиков"
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
+    counter_fields = ("recipes_count", "followers_count")
+
     class Meta:
         verbose_name = "Пользователь"
         verbose_name_plural = "Пользователи"
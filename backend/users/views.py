@@ -2,10 +2,13 @@ from api.pagination import CustomPagination
 from api.serializers import (CustomUserSerializer, FollowListSerializer,
                              FollowSerializer)
 from django.contrib.auth import get_user_model
+from django.db.models import OuterRef, Prefetch, Subquery
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
+from recipes.models import Recipe
 from rest_framework import permissions, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
 from .models import Follow
@@ -18,6 +21,7 @@ class CustomUserViewSet(UserViewSet):
     serializer_class = CustomUserSerializer
     pagination_class = CustomPagination
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    replica_reads = True
 
     @action(
         methods=["POST", "DELETE"],
@@ -56,10 +60,41 @@ class CustomUserViewSet(UserViewSet):
     )
     def subscriptions(self, request):
         user = request.user
-        queryset = User.objects.filter(following__user=user)
+        queryset = User.objects.filter(
+            following__user=user
+        ).prefetch_related(
+            Prefetch("recipes", queryset=self.get_recipes_queryset(request))
+        ).order_by("id")
         pages = self.paginate_queryset(queryset)
         serializer = FollowSerializer(
             pages,
             many=True,
             context={'request': request})
         return self.get_paginated_response(serializer.data)
+
+    def get_recipes_queryset(self, request):
+        queryset = Recipe.objects.only(
+            "id",
+            "name",
+            "image",
+            "image_variants",
+            "cooking_time",
+            "author_id",
+            "pub_date"
+        )
+        limit = request.query_params.get("recipes_limit")
+        if not limit:
+            return queryset
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValidationError(
+                {"recipes_limit": "Введите целое число."}
+            )
+        return queryset.filter(
+            pk__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef("author")
+                ).values("pk")[:max(limit, 0)]
+            )
+        )